@@ -3,9 +3,34 @@ from typing import Optional
 
 class Settings(BaseSettings):
     database_url: str
+    # AsyncEngine/AsyncSession by default; false falls back to the sync engine in a threadpool
+    database_async: bool = True
+    # Connection pool per worker (ignored for SQLite)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     jwt_secret: str 
     jwt_algorithm: str
     jwt_expire_minutes: int = 30
+    bcrypt_rounds: int = 12
+    # Dedicated bcrypt workers and how many hash requests may wait for one before we shed load
+    password_hash_workers: int = 4
+    password_hash_queue_size: int = 32
+    # GET /metrics, per-request query counts, N+1 warnings and the slow-query log; nothing is hooked when off
+    metrics_enabled: bool = False
+    slow_query_ms: float = 200.0
+    n_plus_one_threshold: int = 10
+    # Spans for requests, DB sessions/queries and upstream calls, propagated with W3C traceparent; "memory" or "file"
+    tracing_exporter: str = "off"
+    tracing_file: str = "traces.jsonl"
+    tracing_sample_rate: float = 1.0
+    tracing_service_name: str = "auth-service"
+    # POST /debug/profile runs a sampling profiler for callers sending this in X-Profiler-Token; no route when unset
+    profiler_token: Optional[str] = None
+    profiler_max_seconds: float = 60.0
+    profiler_max_requests: int = 1000
     
     class Config:
         env_file = ".env"
@@ -1,35 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from database import get_db
-from schemas import UserCreate, UserLogin, UserUpdate, UserResponse, Token
+from schemas import UserCreate, UserLogin, UserUpdate, UserResponse, Token, RevocationList
 from service import AuthService
-from utils import create_access_token, verify_token
+from utils import create_access_token, decode_token
 from config import settings
 
 router = APIRouter(prefix="/v1/auth", tags=["authentication"])
 security = HTTPBearer()
 
-def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    email = verify_token(credentials.credentials)
-    if email is None:
+async def get_current_token_payload(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+):
+    payload = decode_token(credentials.credentials)
+    if payload is None or await AuthService(db).is_token_revoked(payload.get("jti")):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
-    return email
+    return payload
+
+def get_current_user_email(payload: dict = Depends(get_current_token_payload)):
+    return payload["sub"]
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    user = auth_service.create_user(user_data)
+    user = await auth_service.create_user(user_data)
     return user
 
 @router.post("/login", response_model=Token)
-async def login(login_data: UserLogin, db: Session = Depends(get_db)):
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    user = auth_service.authenticate_user(login_data.email, login_data.password)
+    user = await auth_service.authenticate_user(login_data.email, login_data.password)
     
     # Old implementation - keeping for reference
     # if not user:
@@ -52,18 +59,20 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
         )
     
     access_token_expires = timedelta(minutes=settings.jwt_expire_minutes)
+    # user_id/username let listings and messaging verify tokens without calling /validate
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "user_id": user.id, "username": user.username},
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
     current_user_email: str = Depends(get_current_user_email),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     auth_service = AuthService(db)
-    user = auth_service.get_user_by_email(current_user_email)
+    user = await auth_service.get_user_by_email(current_user_email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -72,20 +81,42 @@ async def get_current_user(
 async def update_current_user(
     user_update: UserUpdate,
     current_user_email: str = Depends(get_current_user_email),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     auth_service = AuthService(db)
-    user = auth_service.update_user(current_user_email, user_update)
+    user = await auth_service.update_user(current_user_email, user_update)
     return user
 
 # Endpoint for other services to validate tokens
 @router.get("/validate")
 async def validate_token(
     current_user_email: str = Depends(get_current_user_email),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     auth_service = AuthService(db)
-    user = auth_service.get_user_by_email(current_user_email)
+    user = await auth_service.get_user_by_email(current_user_email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"email": user.email, "user_id": user.id, "username": user.username}
\ No newline at end of file
+    return {"email": user.email, "user_id": user.id, "username": user.username}
+
+@router.post("/logout")
+async def logout(
+    payload: dict = Depends(get_current_token_payload),
+    db: AsyncSession = Depends(get_db)
+):
+    auth_service = AuthService(db)
+    if payload.get("jti"):
+        await auth_service.revoke_token(payload)
+    return {"message": "Logged out successfully"}
+
+# Endpoint for other services to sync their token deny lists
+@router.get("/revocations", response_model=RevocationList)
+async def get_revocations(
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # Overlap successive windows so revocations still committing are not missed
+    until = datetime.now(timezone.utc) - timedelta(seconds=5)
+    auth_service = AuthService(db)
+    revoked = await auth_service.get_revoked_tokens(since)
+    return {"revoked": revoked, "until": until}
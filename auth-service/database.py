@@ -1,15 +1,184 @@
-from sqlalchemy import create_engine
+import os
+import time
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from config import settings
+from tracing import session_span
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(database_url: str):
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+class PoolMetrics:
+    """Counters collected by the instrumented pools, served from /health/db"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_connections = 0
+        self.timeouts = 0
+
+    def record_checkout(self, waited: float):
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "overflow_connections": self.overflow_connections,
+            "timeouts": self.timeouts
+        }
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedPoolMixin:
+    # _do_get is where a checkout blocks on a full pool or opens a new connection
+    def _do_get(self):
+        overflow_before = self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_checkout(time.perf_counter() - start)
+        if self.overflow() > max(overflow_before, 0):
+            pool_metrics.overflow_connections += 1
+        return connection
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options() -> dict:
+    if make_url(settings.database_url).get_backend_name() == "sqlite":
+        # SQLite picks its own file/memory pools; sizing options do not apply
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if settings.database_async else InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping
+    }
+
+if settings.database_async:
+    engine = create_async_engine(async_database_url(settings.database_url), **engine_options())
+    SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+else:
+    engine = create_engine(settings.database_url, **engine_options())
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+class SyncSessionAdapter:
+    """Gives a sync Session the AsyncSession API, running each call in a worker thread"""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.flush, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+async def get_db():
+    with session_span():
+        if settings.database_async:
+            async with SessionLocal() as db:
+                yield db
+        else:
+            db = SyncSessionAdapter(SessionLocal())
+            try:
+                yield db
+            finally:
+                await db.close()
+
+async def run_in_transaction(fn):
+    """Run fn(connection) with a sync Connection in a transaction, whichever engine is configured"""
+    if settings.database_async:
+        async with engine.begin() as conn:
+            return await conn.run_sync(fn)
+
+    def run():
+        with engine.begin() as conn:
+            return fn(conn)
+    return await run_in_threadpool(run)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def upgrade_schema(connection):
+    """Apply pending migrations/versions on a sync Connection"""
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["connection"] = connection
+    config.attributes["target_metadata"] = Base.metadata
+    command.upgrade(config, "head")
+
+async def init_db():
+    await run_in_transaction(upgrade_schema)
+
+def pool_status() -> dict:
+    pool = getattr(engine, "sync_engine", engine).pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": settings.db_max_overflow
+        })
+    status.update(pool_metrics.snapshot())
+    return status
@@ -1,13 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from instrumentation import instrument
+from tracing import install_tracing
+from profiling import install_profiler
 from controller import router
-from database import Base, engine
+from database import engine, init_db, pool_status
+from utils import shutdown_password_hashing
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    yield
+    shutdown_password_hashing()
 
-app = FastAPI(title="NCSU Marketplace - Authentication Service", version="1.0.0")
+app = FastAPI(title="NCSU Marketplace - Authentication Service", version="1.0.0", lifespan=lifespan)
 
 app.include_router(router)
+instrument(app, engine)
+install_profiler(app)
 
 @app.get("/")
 async def root():
@@ -15,4 +25,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/db")
+async def database_pool_status():
+    return pool_status()
+
+install_tracing(app, engine)
\ No newline at end of file
@@ -0,0 +1,55 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+def target_metadata():
+    # Only autogenerate needs the models; the app passes its metadata in directly
+    metadata = config.attributes.get("target_metadata")
+    if metadata is None:
+        import models
+        from database import Base
+        metadata = Base.metadata
+    return metadata
+
+def run_migrations(connection):
+    # Batch mode lets ALTERs run on SQLite by copying the table
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata(),
+        render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_offline():
+    from config import settings
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata(),
+        literal_binds=True,
+        render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # The app hands over the connection it is already using (database.upgrade_schema)
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    from config import settings
+    engine = create_engine(settings.database_url)
+    with engine.connect() as connection:
+        run_migrations(connection)
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,262 @@
+import asyncio
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Response, status
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from config import settings
+
+# Where CPU time per thread isn't available, leaf frames of threads that are parked rather than working
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+MAX_DEPTH = 128
+# Which task each event loop is running; private, so request mode falls back to whole-process samples without it
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+
+def thread_cpu_time(native_id: Optional[int]) -> Optional[float]:
+    """CPU seconds a thread has used, or None where the platform can't tell"""
+    if native_id is None or not sys.platform.startswith("linux"):
+        return None
+    try:
+        # Linux's clock id for a thread's CPU time (MAKE_THREAD_CPUCLOCK); an exited thread just raises
+        return time.clock_gettime((~native_id << 3) | 6)
+    except OSError:
+        return None
+
+def frame_label(code) -> str:
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class ProfileSession:
+    """Samples every thread's Python stack from a daemon thread until stopped or past its deadline"""
+
+    def __init__(self, interval: float, timeout: float, requests: Optional[int] = None,
+                 route: Optional[str] = None, method: Optional[str] = None):
+        self.interval = interval
+        # The sampler gives up on its own even if the request that started it never comes back to stop it
+        self.deadline = time.monotonic() + timeout
+        self.requests = requests
+        self.route = route
+        self.method = method
+        self.claimed = 0
+        self.completed = 0
+        self.tasks = set()
+        self.finished = asyncio.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._labels = {}
+        self._cpu = {}
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        await run_in_threadpool(self._thread.join)
+        self.elapsed = time.perf_counter() - self.started
+
+    def claim(self, scope: dict, router) -> bool:
+        """Whether a new request is one of the next N to profile"""
+        if self.claimed >= self.requests or self._stop.is_set():
+            return False
+        if self.method and scope["method"] != self.method:
+            return False
+        if self.route:
+            template = next((route.path for route in router.routes if route.matches(scope)[0] == Match.FULL), None)
+            if template != self.route:
+                return False
+        self.claimed += 1
+        return True
+
+    def enter(self, task):
+        self.tasks.add(task)
+
+    def leave(self, task):
+        self.tasks.discard(task)
+        self.completed += 1
+        if self.completed >= self.requests:
+            self.finished.set()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code)
+        return label
+
+    def _working(self, ident: int, native_id: Optional[int], frame) -> bool:
+        """Whether a thread used CPU since the last sample; only on-CPU stacks are recorded"""
+        used = thread_cpu_time(native_id)
+        if used is None:
+            leaf = frame.f_code
+            return (os.path.basename(leaf.co_filename), leaf.co_name) not in IDLE_FRAMES
+        before = self._cpu.get(ident)
+        self._cpu[ident] = used
+        return before is not None and used > before
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < self.deadline:
+            if self.requests is not None and not self.tasks:
+                continue
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            loop_task = _current_tasks.get(self._loop) if _current_tasks is not None else None
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                # In request mode the event loop only counts while it runs one of the profiled requests
+                if (
+                    ident == self._loop_thread and self.requests is not None
+                    and _current_tasks is not None and loop_task not in self.tasks
+                ):
+                    continue
+                thread = threads.get(ident)
+                if not self._working(ident, getattr(thread, "native_id", None), frame):
+                    continue
+                stack = self._stack(frame)
+                with self._lock:
+                    self.stacks[(thread.name if thread else str(ident),) + stack] += 1
+                    self.samples += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format, as read by flamegraph.pl, inferno and speedscope"""
+        with self._lock:
+            lines = [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        with self._lock:
+            for stack, count in self.stacks.most_common():
+                sample = []
+                for label in stack:
+                    if label not in index:
+                        index[label] = len(frames)
+                        frames.append({"name": label})
+                    sample.append(index[label])
+                samples.append(sample)
+                weights.append(count * self.interval * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{settings.tracing_service_name} profile",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": settings.tracing_service_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+# At most one profile runs per process
+_active: Optional[ProfileSession] = None
+
+class ProfilingMiddleware:
+    """Marks the requests a request-mode profile is waiting for; a single attribute check otherwise"""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        session = _active
+        if session is None or session.requests is None or scope["type"] != "http" or not session.claim(scope, self.router):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        session.enter(task)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.leave(task)
+
+def install_profiler(app: FastAPI):
+    """Add POST /debug/profile when PROFILER_TOKEN is set; otherwise the route and middleware don't exist"""
+    if not settings.profiler_token:
+        return
+    app.add_middleware(ProfilingMiddleware, router=app.router)
+
+    @app.post("/debug/profile", include_in_schema=False)
+    async def profile(
+        seconds: Optional[float] = Query(None, gt=0),
+        requests: Optional[int] = Query(None, gt=0),
+        route: Optional[str] = None,
+        method: Optional[str] = None,
+        interval_ms: float = Query(10.0, ge=1, le=1000),
+        format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+        x_profiler_token: Optional[str] = Header(None)
+    ):
+        """Sample for ?seconds=N, or until the next ?requests=N matching ?route= and ?method= finish (?seconds= then caps the wait)"""
+        global _active
+        if not hmac.compare_digest(x_profiler_token or "", settings.profiler_token):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiler token")
+        if seconds is None and requests is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass seconds or requests")
+        timeout = seconds or settings.profiler_max_seconds
+        if timeout > settings.profiler_max_seconds:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Profiles are limited to {settings.profiler_max_seconds:g} seconds"
+            )
+        if requests is not None and requests > settings.profiler_max_requests:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Profiles are limited to {settings.profiler_max_requests} requests"
+            )
+        if _active is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+
+        session = _active = ProfileSession(interval_ms / 1000, timeout, requests, route, method and method.upper())
+        session.start()
+        try:
+            if requests is None:
+                await asyncio.sleep(timeout)
+            else:
+                try:
+                    await asyncio.wait_for(session.finished.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Also runs when the caller disconnects and the request is cancelled
+            _active = None
+            await session.stop()
+
+        headers = {
+            "X-Profile-Samples": str(session.samples),
+            "X-Profile-Seconds": f"{session.elapsed:.3f}",
+        }
+        if requests is not None:
+            headers["X-Profile-Requests"] = str(session.completed)
+        if format == "speedscope":
+            headers["Content-Disposition"] = 'attachment; filename="profile.speedscope.json"'
+            return Response(content=json.dumps(session.speedscope()), media_type="application/json", headers=headers)
+        return Response(content=session.collapsed(), media_type="text/plain", headers=headers)
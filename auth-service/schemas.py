@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -34,4 +34,15 @@ class Token(BaseModel):
     token_type: str
 
 class TokenData(BaseModel):
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+
+class RevokedTokenResponse(BaseModel):
+    jti: str
+    expires_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class RevocationList(BaseModel):
+    revoked: List[RevokedTokenResponse]
+    until: datetime
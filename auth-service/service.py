@@ -1,18 +1,30 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from models import User
+from models import User, RevokedToken
 from schemas import UserCreate, UserUpdate
-from utils import get_password_hash, verify_password
+from utils import get_password_hash_async, verify_and_update_password_async, PasswordHashingBusy
 from fastapi import HTTPException, status
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime, timezone
 
 class AuthService:
-    def __init__(self, db: Session):
+    HASHING_BUSY = "Too many authentication requests, please retry"
+
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def create_user(self, user_data: UserCreate) -> User:
+    async def create_user(self, user_data: UserCreate) -> User:
+        try:
+            hashed_password = await get_password_hash_async(user_data.password)
+        except PasswordHashingBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=self.HASHING_BUSY,
+                headers={"Retry-After": "1"}
+            )
+        
         try:
-            hashed_password = get_password_hash(user_data.password)
             db_user = User(
                 email=user_data.email,
                 username=user_data.username,
@@ -21,26 +33,71 @@ class AuthService:
                 phone_number=user_data.phone_number
             )
             self.db.add(db_user)
-            self.db.commit()
-            self.db.refresh(db_user)
+            await self.db.commit()
+            await self.db.refresh(db_user)
             return db_user
         except IntegrityError:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email or username already registered"
             )
     
-    def authenticate_user(self, email: str, password: str) -> Optional[User]:
-        user = self.db.query(User).filter(User.email == email).first()
+    async def authenticate_user(self, email: str, password: str) -> Optional[User]:
+        user = await self.get_user_by_email(email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        
+        try:
+            valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+        except PasswordHashingBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=self.HASHING_BUSY,
+                headers={"Retry-After": "1"}
+            )
+        if not valid:
             return None
+        
+        # Stored hash uses an outdated cost or scheme; upgrade it while we have the password
+        if new_hash:
+            user.hashed_password = new_hash
+            await self.db.commit()
         return user
     
-    def get_user_by_email(self, email: str) -> Optional[User]:
-        return self.db.query(User).filter(User.email == email).first()
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        result = await self.db.execute(select(User).filter(User.email == email))
+        return result.scalars().first()
+    
+    async def revoke_token(self, payload: dict) -> RevokedToken:
+        revoked = await self.db.get(RevokedToken, payload["jti"])
+        if revoked:
+            return revoked
+        
+        revoked = RevokedToken(
+            jti=payload["jti"],
+            user_email=payload["sub"],
+            expires_at=datetime.fromtimestamp(payload["exp"], tz=timezone.utc),
+            revoked_at=datetime.now(timezone.utc)
+        )
+        self.db.add(revoked)
+        await self.db.commit()
+        return revoked
+    
+    async def is_token_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            return False
+        return await self.db.get(RevokedToken, jti) is not None
+    
+    async def get_revoked_tokens(self, since: Optional[datetime] = None) -> List[RevokedToken]:
+        # Tokens that have expired anyway are useless to downstream deny lists
+        query = select(RevokedToken).filter(
+            RevokedToken.expires_at > datetime.now(timezone.utc)
+        )
+        if since:
+            query = query.filter(RevokedToken.revoked_at >= since)
+        result = await self.db.execute(query.order_by(RevokedToken.revoked_at.asc()))
+        return result.scalars().all()
     
     def validate_user_data(self, user_data: UserCreate) -> bool:
     # """Intentionally using magic numbers"""
@@ -62,8 +119,8 @@ class AuthService:
         
         return True
     
-    def update_user(self, email: str, user_update: UserUpdate) -> User:
-        user = self.get_user_by_email(email)
+    async def update_user(self, email: str, user_update: UserUpdate) -> User:
+        user = await self.get_user_by_email(email)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -74,6 +131,6 @@ class AuthService:
         for field, value in update_data.items():
             setattr(user, field, value)
         
-        self.db.commit()
-        self.db.refresh(user)
+        await self.db.commit()
+        await self.db.refresh(user)
         return user
\ No newline at end of file
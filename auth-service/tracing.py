@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace id, parent span id, sampled) from a W3C traceparent header, or None if it is malformed"""
+    if not header:
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    # Version 00 has exactly four fields; later versions may append more
+    if version == "00" and len(parts) != 4:
+        return None
+    try:
+        sampled = bool(int(flags, 16) & 1)
+        int(trace_id, 16)
+        int(span_id, 16)
+    except ValueError:
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "sampled",
+        "start_time", "_started", "duration_ms", "attributes", "error"
+    )
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attributes: Dict[str, object] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": settings.tracing_service_name,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class SpanExporter:
+    """Receives every finished, sampled span"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+class InMemoryExporter(SpanExporter):
+    """Keeps the most recent spans in a bounded buffer, for tests and in-process tools"""
+
+    def __init__(self, maxlen: int = 10000):
+        self.spans = deque(maxlen=maxlen)
+
+    def export(self, span: Span):
+        self.spans.append(span.to_dict())
+
+    def clear(self):
+        self.spans.clear()
+
+class FileExporter(SpanExporter):
+    """Appends one JSON line per span; benchmarks/trace_breakdown.py reads these files back"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+# The span new work should be a child of; threadpool calls copy the context, so sync-mode queries see it too
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter], sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(self, name: str, kind: str = "internal", traceparent: Optional[str] = None) -> Span:
+        """A child of the current span, of the incoming traceparent's span, or the root of a new trace"""
+        parent = current_span.get()
+        if parent is not None:
+            return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled)
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            return Span(name, kind, trace_id, parent_id, sampled)
+        return Span(name, kind, os.urandom(16).hex(), None, random.random() < self.sample_rate)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.finish()
+        if error is not None:
+            span.error = type(error).__name__
+        if span.sampled and self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception:
+                logger.exception("failed to export span %s", span.name)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", activate: bool = True):
+        """Times a block; with activate, spans started inside it become its children"""
+        span = self.start_span(name, kind)
+        token = current_span.set(span) if activate else None
+        try:
+            yield span
+        except BaseException as exc:
+            self.end_span(span, exc)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            if token is not None:
+                current_span.reset(token)
+
+def create_tracer() -> Tracer:
+    exporter = None
+    if settings.tracing_exporter == "memory":
+        exporter = InMemoryExporter()
+    elif settings.tracing_exporter == "file":
+        exporter = FileExporter(settings.tracing_file)
+    return Tracer(exporter, settings.tracing_sample_rate)
+
+tracer = create_tracer()
+
+class TracingMiddleware:
+    """Opens the server span for each HTTP request, continuing the caller's trace from its traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        span = tracer.start_span(f"{scope['method']} {scope['path']}", "server", traceparent)
+        span.set("http.method", scope["method"])
+        token = current_span.set(span)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set("http.status_code", message["status"])
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            current_span.reset(token)
+            # Name the span after the route template so traces group by endpoint, not by id
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.name = f"{scope['method']} {route}"
+                span.set("http.route", route)
+            tracer.end_span(span, error)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = current_span.get()
+    if parent is not None:
+        span = tracer.start_span("db.query", "client")
+        span.set("db.statement", " ".join(statement.split())[:500])
+        conn.info.setdefault("trace_spans", []).append(span)
+    else:
+        conn.info.setdefault("trace_spans", []).append(None)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info["trace_spans"].pop()
+    if span is not None:
+        tracer.end_span(span)
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("trace_spans") if connection is not None else None
+    if spans:
+        span = spans.pop()
+        if span is not None:
+            tracer.end_span(span, exception_context.original_exception)
+
+def traced_route(route: APIRoute):
+    """Wrap a route's ASGI app in a span covering dependencies, the endpoint and response serialization"""
+    inner = route.app
+    name = f"handler {route.endpoint.__name__}"
+
+    async def app(scope, receive, send):
+        with tracer.span(name):
+            await inner(scope, receive, send)
+    return app
+
+@contextmanager
+def session_span():
+    """Spans how long a request holds its DB session; not activated, since FastAPI closes it after the handler span ends"""
+    if not tracer.enabled or current_span.get() is None:
+        yield
+        return
+    with tracer.span("db.session", activate=False):
+        yield
+
+@contextmanager
+def client_span(upstream: str, request):
+    """Client span for an upstream call, sent along as its traceparent header; ends with the error if the call raises"""
+    if not tracer.enabled:
+        yield None
+        return
+    with tracer.span(f"{request.method} {upstream}", "client", activate=False) as span:
+        span.set("http.method", request.method)
+        span.set("http.url", str(request.url.copy_with(query=None)))
+        request.headers["traceparent"] = span.traceparent
+        yield span
+
+def install_tracing(app: FastAPI, engine):
+    """Add the middleware, handler and query spans when TRACING_EXPORTER is set; otherwise leave everything untouched"""
+    if not tracer.enabled:
+        return
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.app = traced_route(route)
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+    app.add_middleware(TracingMiddleware)
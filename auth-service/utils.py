@@ -1,10 +1,30 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds makes hashes made with a lower cost report needs_update, so they get upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash"
+)
+# Running plus queued hash operations; anything beyond this is rejected instead of piling up
+_hash_slots = asyncio.Semaphore(settings.password_hash_workers + settings.password_hash_queue_size)
+
+class PasswordHashingBusy(Exception):
+    pass
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password[:72], hashed_password)  # Truncate to 72 bytes
@@ -12,6 +32,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password[:72])  # Truncate to 72 bytes
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password[:72], hashed_password)  # Truncate to 72 bytes
+
+async def _run_hashing(func, *args):
+    if _hash_slots.locked():
+        raise PasswordHashingBusy()
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a new hash when the stored one needs upgrading"""
+    return await _run_hashing(verify_and_update_password, plain_password, hashed_password)
+
+def shutdown_password_hashing():
+    _hash_executor.shutdown(wait=True, cancel_futures=True)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     now = datetime.now(timezone.utc)
@@ -21,16 +61,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = now + timedelta(minutes=15)
 
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    # jti lets downstream services honour revocations without calling back here
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
+    encoded_jwt = jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
     return encoded_jwt
 
-def verify_token(token: str):
+def decode_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str):
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return payload["sub"]
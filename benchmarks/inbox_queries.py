@@ -0,0 +1,112 @@
+"""Count the queries behind one inbox load and check they don't grow with inbox size.
+
+    python benchmarks/inbox_queries.py --sizes 1 10 100 1000
+
+Each size seeds a fresh SQLite database with that many conversations for one user,
+rebuilds the conversation counters and loads the inbox through
+MessagingService.get_user_conversations. Exits non-zero if the query count differs
+between sizes.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from service_loader import load_service
+
+USER_ID = 1
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+def seed(messaging, conversations, messages_per_conversation):
+    models = messaging.models
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def run(connection):
+        connection.execute(models.Conversation.__table__.insert(), [{
+            "id": i + 1,
+            "listing_id": i + 1,
+            "buyer_id": USER_ID if i % 2 else i + 2,
+            "buyer_email": "buyer@ncsu.edu",
+            "seller_id": i + 2 if i % 2 else USER_ID,
+            "seller_email": "seller@ncsu.edu",
+            "listing_title": f"Listing {i + 1}",
+            "is_active": True,
+            "created_at": base + timedelta(minutes=i),
+            "updated_at": base + timedelta(minutes=i),
+        } for i in range(conversations)])
+        connection.execute(models.Message.__table__.insert(), [{
+            "conversation_id": i + 1,
+            "sender_id": USER_ID if j % 2 else i + 2,
+            "sender_email": "sender@ncsu.edu",
+            "content": f"message {j} in conversation {i + 1}",
+            "is_read": j % 3 == 0,
+            "created_at": base + timedelta(minutes=i, seconds=j),
+        } for i in range(conversations) for j in range(messages_per_conversation)])
+    return run
+
+async def run_size(size, args):
+    env = {"DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/inbox_bench.db"}
+    messaging = load_service("messaging-service", env)
+
+    async with messaging.main.app.router.lifespan_context(messaging.main.app):
+        await messaging.database.run_in_transaction(seed(messaging, size, args.messages))
+        async with messaging.database.SessionLocal() as db:
+            await messaging.service.MessagingService(db).reconcile_counters()
+        counter = QueryCounter(messaging.database.engine)
+
+        queries, samples = set(), []
+        for _ in range(args.repeat):
+            async with messaging.database.SessionLocal() as db:
+                service = messaging.service.MessagingService(db)
+                counter.count = 0
+                start = time.perf_counter()
+                conversations = await service.get_user_conversations(USER_ID)
+                samples.append((time.perf_counter() - start) * 1000)
+                queries.add(counter.count)
+        assert len(conversations) == size
+
+    await messaging.database.engine.dispose()
+    return {
+        "conversations": size,
+        "queries": max(queries),
+        "p50_ms": round(statistics.median(samples), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=10, help="messages per conversation")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"{'conversations':>14}{'queries':>10}{'p50 ms':>12}")
+    results = []
+    for size in args.sizes:
+        result = asyncio.run(run_size(size, args))
+        print(f"{result['conversations']:>14}{result['queries']:>10}{result['p50_ms']:>12}")
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if len({result["queries"] for result in results}) > 1:
+        print("query count grows with inbox size", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
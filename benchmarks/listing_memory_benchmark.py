@@ -0,0 +1,109 @@
+"""Compare memory per listings request: ORM instances vs ?fields=detail vs ?fields=summary.
+
+    python benchmarks/listing_memory_benchmark.py --sizes 1000 10000 50000
+
+Each size seeds a fresh SQLite database with listings carrying a description of
+--description-bytes, then measures with tracemalloc:
+
+  result_kb  memory still held by what ListingService.get_listings returned
+  peak_kb    peak allocation over a whole unpaged GET /v1/listings/ request
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from service_loader import load_service
+
+MODES = {"orm": None, "detail": "detail", "summary": "summary"}
+
+def seed(listings, size, description_bytes):
+    models = listings.models
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    categories = list(models.ListingCategory)
+    description = ("Gently used, pick up on campus. " * (description_bytes // 32 + 1))[:description_bytes]
+
+    def run(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"Listing {i}",
+            "description": description,
+            "price": round(1 + i % 997 * 1.01, 2),
+            "category": categories[i % len(categories)],
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": f"seller{i % 50}@ncsu.edu",
+            "seller_id": i % 50,
+            "images": [f"https://img.example/{i}.jpg"],
+            "created_at": base + timedelta(seconds=i),
+        } for i in range(size)])
+    return run
+
+async def result_kb(listings, fields):
+    async with listings.database.SessionLocal() as db:
+        service = listings.service.ListingService(db)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = await service.get_listings(listings.schemas.ListingFilters(), fields)
+            held, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del result
+    return held // 1024
+
+async def request_peak_kb(client, fields):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        response = await client.get("/v1/listings/", params={"fields": fields} if fields else None)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    response.raise_for_status()
+    return peak // 1024, len(response.content) // 1024
+
+async def run_size(size, args):
+    listings = load_service("listings-service", {
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/memory_bench.db",
+        "RESPONSE_CACHE_BACKEND": "off",
+    })
+    app = listings.main.app
+    result = {"rows": size}
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed(listings, size, args.description_bytes))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for mode, fields in MODES.items():
+                # One untimed request first so lazily built state doesn't count
+                await client.get("/v1/listings/", params={"fields": fields} if fields else None)
+                peak, body = await request_peak_kb(client, fields)
+                result[mode] = {"result_kb": await result_kb(listings, fields), "peak_kb": peak, "body_kb": body}
+    await listings.database.engine.dispose()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--description-bytes", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'mode':>9}{'result KB':>12}{'peak KB':>11}{'body KB':>10}")
+    results = []
+    for size in args.sizes:
+        result = asyncio.run(run_size(size, args))
+        for mode in MODES:
+            stats = result[mode]
+            print(f"{size:>8}{mode:>9}{stats['result_kb']:>12}{stats['peak_kb']:>11}{stats['body_kb']:>10}")
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
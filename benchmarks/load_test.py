@@ -0,0 +1,367 @@
+"""Load-test all three services in-process and report latency, throughput and query counts.
+
+    python benchmarks/load_test.py --duration 30 --concurrency 20 --output run.json
+    python benchmarks/load_test.py --mix browse=1,login=1 --compare run.json
+
+auth-, listings- and messaging-service are imported into this process, each with
+its own SQLite database, and reach each other through httpx.ASGITransport instead
+of the network. Setup registers --users accounts, inserts --listings listings and
+opens a few conversations per user. Then --concurrency virtual users run weighted
+scenarios (--mix) for --duration seconds after a --warmup. Per endpoint the report
+has request counts, status codes, p50/p95/p99 latency, throughput and the SQL
+queries each request caused in every service, including queries in services it
+called. The harness runs in the same process and event loop as the services, so
+compare numbers between runs of this script, not with a deployed stack.
+"""
+import argparse
+import asyncio
+import contextvars
+import inspect
+import json
+import math
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import event
+
+from service_loader import load_service
+
+SERVICES = ("auth", "listings", "messaging")
+DEFAULT_MIX = "browse=45,search=20,inbox=20,send=10,login=5"
+PASSWORD = "benchmark-password"
+SEARCH_WORDS = ["calculus", "textbook", "desk", "lamp", "laptop", "charger", "bike", "hoodie", "fridge", "chair"]
+
+# The endpoint label of the request being served, so queries can be attributed to it
+current_endpoint = contextvars.ContextVar("current_endpoint", default=None)
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = defaultdict(Counter)
+        self.scenarios = Counter()
+
+    def count_queries(self, service, engine):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            endpoint = current_endpoint.get()
+            if endpoint is not None:
+                self.queries[endpoint][service] += 1
+        event.listen(getattr(engine, "sync_engine", engine), "before_cursor_execute", count)
+
+class Cluster:
+    """The three apps wired to each other in-process, plus one client per app for the virtual users"""
+
+    def __init__(self, args):
+        directory = tempfile.mkdtemp()
+        common = {
+            "JWT_SECRET": "load-test-secret",
+            "JWT_ALGORITHM": "HS256",
+            "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+            "DATABASE_ASYNC": "false" if args.sync else "true",
+            "AUTH_SERVICE_URL": "http://auth-service",
+            "LISTINGS_SERVICE_URL": "http://listings-service",
+            "MESSAGING_SERVICE_URL": "http://messaging-service",
+            "LISTING_EVENTS_SECRET": "load-test-events",
+            "RESPONSE_CACHE_BACKEND": args.response_cache,
+        }
+        self.services = {
+            name: load_service(f"{name}-service", dict(common, DATABASE_URL=f"sqlite:///{directory}/{name}.db"))
+            for name in SERVICES
+        }
+        if args.remote_validation:
+            # Without the shared secret every authenticated request goes through auth's /validate
+            for name in ("listings", "messaging"):
+                self.services[name].config.settings.jwt_secret = None
+
+        listings, messaging = self.services["listings"], self.services["messaging"]
+        for service in (listings, messaging):
+            service.http_clients.clients.use("auth", self.client("auth"))
+        listings.http_clients.clients.use("messaging", self.client("messaging"))
+        messaging.http_clients.clients.use("listings", self.client("listings"))
+        self.clients = {name: self.client(name) for name in SERVICES}
+
+    def client(self, name):
+        transport = httpx.ASGITransport(app=self.services[name].main.app)
+        return httpx.AsyncClient(transport=transport, base_url=f"http://{name}-service", timeout=60)
+
+    async def __aenter__(self):
+        self._stack = AsyncExitStack()
+        for service in self.services.values():
+            app = service.main.app
+            await self._stack.enter_async_context(app.router.lifespan_context(app))
+        for client in self.clients.values():
+            await self._stack.enter_async_context(client)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._stack.aclose()
+        for service in self.services.values():
+            # AsyncEngine.dispose() is a coroutine, Engine.dispose() is not
+            disposed = service.database.engine.dispose()
+            if inspect.isawaitable(disposed):
+                await disposed
+
+class Session:
+    """Sends requests on behalf of the virtual users and records how they went"""
+
+    def __init__(self, cluster, recorder):
+        self.cluster = cluster
+        self.recorder = recorder
+
+    async def call(self, label, service, method, url, **kwargs):
+        token = current_endpoint.set(label)
+        start = time.perf_counter()
+        try:
+            response = await self.cluster.clients[service].request(method, url, **kwargs)
+            status = response.status_code
+        except Exception as exc:
+            response, status = None, type(exc).__name__
+        finally:
+            current_endpoint.reset(token)
+        self.recorder.samples[label].append((time.perf_counter() - start) * 1000)
+        self.recorder.statuses[label][str(status)] += 1
+        return response if response is not None and response.status_code < 400 else None
+
+class User:
+    def __init__(self, user_id, email, token):
+        self.id = user_id
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.conversations = []
+        self.last_seen = {}
+
+SCENARIOS = {}
+
+def scenario(name):
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+@scenario("browse")
+async def browse(session, user, rng, world):
+    params = {"limit": 20}
+    if rng.random() < 0.5:
+        params["category"] = rng.choice(world["categories"])
+    await session.call("GET /v1/listings/facets", "listings", "GET", "/v1/listings/facets", params=params)
+    response = await session.call("GET /v1/listings/", "listings", "GET", "/v1/listings/", params=params)
+    if response is not None and response.json()["items"]:
+        listing_id = rng.choice(response.json()["items"])["id"]
+        await session.call("GET /v1/listings/{id}", "listings", "GET", f"/v1/listings/{listing_id}")
+
+@scenario("search")
+async def search(session, user, rng, world):
+    params = {"search": rng.choice(SEARCH_WORDS), "limit": 20}
+    await session.call("GET /v1/listings/?search=", "listings", "GET", "/v1/listings/", params=params)
+
+@scenario("inbox")
+async def inbox(session, user, rng, world):
+    response = await session.call("GET /v1/conversations/", "messaging", "GET", "/v1/conversations/", headers=user.headers)
+    if response is None or not response.json():
+        return
+    # Poll the most recently active conversation for anything new
+    conversation_id = response.json()[0]["id"]
+    params = {"since_id": user.last_seen.get(conversation_id, 0)}
+    response = await session.call(
+        "GET /v1/conversations/{id}/messages", "messaging", "GET",
+        f"/v1/conversations/{conversation_id}/messages", params=params, headers=user.headers
+    )
+    if response is not None and response.json():
+        user.last_seen[conversation_id] = response.json()[-1]["id"]
+
+@scenario("send")
+async def send(session, user, rng, world):
+    if not user.conversations:
+        return
+    conversation_id = rng.choice(user.conversations)
+    await session.call(
+        "POST /v1/conversations/{id}/messages", "messaging", "POST",
+        f"/v1/conversations/{conversation_id}/messages", json={"content": f"Is this still available? {rng.random()}"},
+        headers=user.headers
+    )
+
+@scenario("login")
+async def login(session, user, rng, world):
+    await session.call("POST /v1/auth/login", "auth", "POST", "/v1/auth/login", json={"email": user.email, "password": PASSWORD})
+
+def parse_mix(raw):
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name.strip()!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+async def setup(cluster, args, rng):
+    """Users through the API, listings straight into the database, conversations through the API"""
+    clients = cluster.clients
+    users = []
+    for index in range(args.users):
+        email = f"user{index}@ncsu.edu"
+        response = await clients["auth"].post(
+            "/v1/auth/register", json={"email": email, "username": f"user{index}", "password": PASSWORD}
+        )
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        response = await clients["auth"].post("/v1/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        users.append(User(user_id, email, response.json()["access_token"]))
+
+    listings = cluster.services["listings"]
+    models = listings.models
+    categories = list(models.ListingCategory)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def insert(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": " ".join(rng.sample(SEARCH_WORDS, 2)) + f" {index}",
+            "description": " ".join(rng.choices(SEARCH_WORDS, k=20)),
+            "price": round(rng.uniform(1, 1500), 2),
+            "category": categories[index % len(categories)],
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": users[index % len(users)].email,
+            "seller_id": users[index % len(users)].id,
+            "images": [],
+            "created_at": base + timedelta(minutes=index),
+        } for index in range(args.listings)])
+    await listings.database.run_in_transaction(insert)
+
+    by_id = {user.id: user for user in users}
+    for buyer_index, buyer in enumerate(users):
+        for offset in range(1, args.conversations_per_user + 1):
+            # Listing i belongs to user i % len(users), so an offset never lands on the buyer's own
+            listing_id = (buyer_index + offset) % len(users) + 1 if len(users) > 1 else None
+            if listing_id is None or listing_id > args.listings:
+                continue
+            response = await clients["messaging"].post(
+                "/v1/conversations/", json={"listing_id": listing_id}, headers=buyer.headers
+            )
+            response.raise_for_status()
+            conversation = response.json()
+            buyer.conversations.append(conversation["id"])
+            by_id[conversation["seller_id"]].conversations.append(conversation["id"])
+            await clients["messaging"].post(
+                f"/v1/conversations/{conversation['id']}/messages", json={"content": "Hi!"}, headers=buyer.headers
+            )
+    return users, {"categories": [category.value for category in categories]}
+
+async def drive(session, users, world, args, mix, seconds):
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + seconds
+
+    async def virtual_user(index):
+        rng = random.Random(args.seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            await SCENARIOS[name](session, rng.choice(users), rng, world)
+            session.recorder.scenarios[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(index) for index in range(args.concurrency)))
+    return time.perf_counter() - started
+
+def percentile(samples, p):
+    """Nearest-rank percentile of already sorted samples"""
+    return round(samples[max(0, math.ceil(p / 100 * len(samples)) - 1)], 3)
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for label, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        queries = recorder.queries[label]
+        endpoints[label] = {
+            "requests": len(samples),
+            "statuses": dict(recorder.statuses[label]),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "p99_ms": percentile(samples, 99),
+            "max_ms": round(samples[-1], 3),
+            "queries_per_request": round(sum(queries.values()) / len(samples), 2),
+            "queries_by_service": {service: round(count / len(samples), 2) for service, count in sorted(queries.items())},
+        }
+    requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 2),
+        "scenarios": dict(recorder.scenarios),
+        "endpoints": endpoints,
+    }
+
+def print_report(summary, previous=None):
+    print(f"\n{summary['requests']} requests in {summary['elapsed_seconds']}s ({summary['throughput_rps']} req/s)")
+    print(f"  {'endpoint':<38}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}  statuses")
+    for label, stats in summary["endpoints"].items():
+        print(f"  {label:<38}{stats['requests']:>7}{stats['throughput_rps']:>9}{stats['p50_ms']:>9}"
+              f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['queries_per_request']:>9}  {stats['statuses']}")
+
+    if previous:
+        print("\n  compared with the previous run (p95 and req/s, negative p95 change is better)")
+        for label, stats in summary["endpoints"].items():
+            before = previous["endpoints"].get(label)
+            if not before:
+                continue
+            p95 = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+            rps = (stats["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100 if before["throughput_rps"] else 0
+            print(f"  {label:<38}p95 {p95:+7.1f}%   req/s {rps:+7.1f}%")
+
+async def run(args, mix):
+    rng = random.Random(args.seed)
+    cluster = Cluster(args)
+    async with cluster:
+        started = time.perf_counter()
+        users, world = await setup(cluster, args, rng)
+        print(f"setup: {len(users)} users, {args.listings} listings in {time.perf_counter() - started:.1f}s")
+
+        if args.warmup:
+            await drive(Session(cluster, Recorder()), users, world, args, mix, args.warmup)
+
+        recorder = Recorder()
+        for name, service in cluster.services.items():
+            recorder.count_queries(name, service.database.engine)
+        elapsed = await drive(Session(cluster, recorder), users, world, args, mix, args.duration)
+    return summarize(recorder, elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds first")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users running at once")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--conversations-per-user", type=int, default=3)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="lower it to take password hashing out of logins")
+    parser.add_argument("--response-cache", default="memory", help="RESPONSE_CACHE_BACKEND for listings-service")
+    parser.add_argument("--remote-validation", action="store_true", help="validate every token through auth's /validate")
+    parser.add_argument("--sync", action="store_true", help="DATABASE_ASYNC=false in every service")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the run as JSON to this file")
+    parser.add_argument("--compare", help="a previous --output file to compare against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    summary = asyncio.run(run(args, mix))
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["summary"]
+    print_report(summary, previous)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "config": dict(vars(args), mix=mix),
+                "summary": summary,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Replay a captured JSONL traffic file against the three services.
+
+    python benchmarks/replay.py benchmarks/sample_capture.jsonl --speed 10 --concurrency 20
+    python benchmarks/replay.py capture.jsonl --url auth=http://localhost:8001 \\
+        --url listings=http://localhost:8002 --url messaging=http://localhost:8003
+
+Without --url the services run in-process on SQLite, wired together as in
+load_test.py. The capture is read one line at a time, and no more than
+--concurrency requests are in flight. Each capture line is one request:
+
+    {"ts": 12.5, "service": "listings", "method": "POST", "path": "/v1/listings/",
+     "user": "seller@ncsu.edu", "json": {...}, "status": 200, "id": 812, "keys": ["id", "title"]}
+
+  ts         seconds (or an ISO-8601 time); gaps between requests are kept, divided by --speed
+  service    auth, listings or messaging
+  path       path and query string as captured
+  user       who sent it; replayed with a fresh token for a local account of that email
+  json       request body, if any
+  status     captured status code; a different status is reported as a mismatch
+  id         id in the captured response; later references to it are rewritten to the new one
+  keys       keys an object response must have, or item_keys for each item of a list response
+
+Lines without a method and path (such as the backlog in the repo's own
+requests.jsonl) are skipped and counted. Ids that were created before the capture
+started cannot be mapped and are sent unchanged.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+from load_test import Cluster, percentile
+
+PASSWORD = "replay-password"
+# Where captured ids appear, and which kind of id each one is
+PATH_IDS = [
+    (re.compile(r"^(/v1/listings/)(\d+)"), "listing"),
+    (re.compile(r"^(/v1/conversations/)(\d+)"), "conversation"),
+]
+QUERY_IDS = {"ids": "listing", "since_id": "message", "before_id": "message"}
+BODY_IDS = {"listing_id": "listing"}
+# Requests whose response id is a new id of that kind
+CREATES = [
+    ("POST", re.compile(r"^/v1/listings/?$"), "listing"),
+    ("POST", re.compile(r"^/v1/conversations/?$"), "conversation"),
+    ("POST", re.compile(r"^/v1/conversations/\d+/messages/?$"), "message"),
+]
+
+def parse_ts(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def route_of(path: str) -> str:
+    """The path without its query and with numeric segments as {id}, for grouping results"""
+    return re.sub(r"/\d+", "/{id}", urlsplit(path).path)
+
+class Capture:
+    """Iterates a capture file lazily, one replayable record at a time"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Tuple[int, dict]]:
+        with open(self.path) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.skipped += 1
+                    continue
+                if not isinstance(record, dict) or "method" not in record or "path" not in record:
+                    self.skipped += 1
+                    continue
+                yield number, record
+
+class IdMap:
+    """Captured id -> replayed id, per kind; lookups wait for creations that are still in flight"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._ids: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.mapped = 0
+        self.unmapped = 0
+
+    def expect(self, kind: str, captured):
+        self._ids.setdefault((kind, str(captured)), asyncio.get_running_loop().create_future())
+
+    def resolve(self, kind: str, captured, replayed):
+        future = self._ids.get((kind, str(captured)))
+        if future is not None and not future.done():
+            future.set_result(None if replayed is None else str(replayed))
+
+    async def lookup(self, kind: str, captured) -> str:
+        future = self._ids.get((kind, str(captured)))
+        replayed = None
+        if future is not None:
+            try:
+                replayed = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        if replayed is None:
+            self.unmapped += 1
+            return str(captured)
+        self.mapped += 1
+        return replayed
+
+class Tokens:
+    """A bearer token per captured user, for a local account registered on first use"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self._tokens: Dict[str, asyncio.Future] = {}
+
+    async def headers(self, email: Optional[str]) -> dict:
+        if not email:
+            return {}
+        if email not in self._tokens:
+            self._tokens[email] = asyncio.ensure_future(self._login(email))
+        return {"Authorization": f"Bearer {await self._tokens[email]}"}
+
+    async def _login(self, email: str) -> str:
+        username = re.sub(r"\W", "_", email)
+        # 400 means the account already exists, e.g. from an earlier run against the same stack
+        response = await self.client.post(
+            "/v1/auth/register", json={"email": email, "username": username, "password": PASSWORD}
+        )
+        if response.status_code not in (200, 400):
+            response.raise_for_status()
+        response = await self.client.post("/v1/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+def check_shape(record: dict, body) -> Optional[str]:
+    if "keys" in record:
+        if not isinstance(body, dict):
+            return "expected an object"
+        missing = set(record["keys"]) - body.keys()
+        if missing:
+            return f"missing {sorted(missing)}"
+    if "item_keys" in record:
+        if not isinstance(body, list):
+            return "expected a list"
+        for item in body:
+            missing = set(record["item_keys"]) - (item.keys() if isinstance(item, dict) else set())
+            if missing:
+                return f"item missing {sorted(missing)}"
+    return None
+
+class Replayer:
+    def __init__(self, clients: Dict[str, httpx.AsyncClient], args):
+        self.clients = clients
+        self.args = args
+        self.ids = IdMap(args.id_timeout)
+        self.tokens = Tokens(clients["auth"])
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.mismatches = []
+        self.lag = []
+
+    async def rewrite(self, record: dict) -> Tuple[str, Optional[dict]]:
+        parts = urlsplit(record["path"])
+        path = parts.path
+        for pattern, kind in PATH_IDS:
+            match = pattern.match(path)
+            if match:
+                replayed = await self.ids.lookup(kind, match.group(2))
+                path = match.group(1) + replayed + path[match.end():]
+        query = []
+        for name, value in parse_qsl(parts.query, keep_blank_values=True):
+            kind = QUERY_IDS.get(name)
+            if kind and name == "ids":
+                value = ",".join([await self.ids.lookup(kind, part) for part in value.split(",") if part])
+            elif kind:
+                value = await self.ids.lookup(kind, value)
+            query.append((name, value))
+        body = record.get("json")
+        if isinstance(body, dict):
+            body = dict(body)
+            for name, kind in BODY_IDS.items():
+                if name in body:
+                    body[name] = int(await self.ids.lookup(kind, body[name]))
+        return path + ("?" + urlencode(query) if query else ""), body
+
+    def created_kind(self, record: dict) -> Optional[str]:
+        path = urlsplit(record["path"]).path
+        for method, pattern, kind in CREATES:
+            if record["method"].upper() == method and pattern.match(path):
+                return kind
+        return None
+
+    async def send(self, number: int, record: dict):
+        kind = self.created_kind(record) if "id" in record else None
+        replayed_id = None
+        label = f"{record['method'].upper()} {route_of(record['path'])}"
+        try:
+            path, body = await self.rewrite(record)
+            headers = await self.tokens.headers(record.get("user"))
+            start = time.perf_counter()
+            response = await self.clients[record["service"]].request(
+                record["method"].upper(), path, json=body, headers=headers
+            )
+            self.samples[label].append((time.perf_counter() - start) * 1000)
+            self.statuses[label][str(response.status_code)] += 1
+            payload = response.json() if response.content else None
+            if kind and response.status_code < 400 and isinstance(payload, dict):
+                replayed_id = payload.get("id")
+
+            problem = None
+            if record.get("status") is not None and response.status_code != record["status"]:
+                problem = f"status {response.status_code}, captured {record['status']}"
+            elif response.status_code < 400:
+                problem = check_shape(record, payload)
+            if problem:
+                self.mismatches.append({"line": number, "request": label, "problem": problem})
+        except Exception as exc:
+            self.statuses[label][type(exc).__name__] += 1
+            self.mismatches.append({"line": number, "request": label, "problem": repr(exc)})
+        finally:
+            if kind:
+                self.ids.resolve(kind, record["id"], replayed_id)
+
+    async def replay(self, capture: Capture) -> float:
+        slots = asyncio.Semaphore(self.args.concurrency)
+        tasks = set()
+        first_ts = None
+        started = time.perf_counter()
+
+        async def run(number, record):
+            try:
+                await self.send(number, record)
+            finally:
+                slots.release()
+
+        for number, record in capture:
+            ts = parse_ts(record.get("ts"))
+            if ts is not None and self.args.speed > 0:
+                first_ts = ts if first_ts is None else first_ts
+                due = started + (ts - first_ts) / self.args.speed
+                if due > time.perf_counter():
+                    await asyncio.sleep(due - time.perf_counter())
+            # Waiting for a free slot is what keeps reading lazy: nothing is read ahead of it
+            await slots.acquire()
+            if ts is not None and self.args.speed > 0:
+                self.lag.append(max(0.0, time.perf_counter() - due) * 1000)
+            kind = self.created_kind(record) if "id" in record else None
+            if kind:
+                self.ids.expect(kind, record["id"])
+            task = asyncio.ensure_future(run(number, record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    def summary(self, elapsed: float, skipped: int) -> dict:
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            endpoints[label] = {
+                "requests": len(samples),
+                "statuses": dict(self.statuses[label]),
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+            }
+        replayed = sum(sum(statuses.values()) for statuses in self.statuses.values())
+        lag = sorted(self.lag)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "replayed": replayed,
+            "skipped_lines": skipped,
+            "throughput_rps": round(replayed / elapsed, 2) if elapsed else 0,
+            "schedule_lag_p95_ms": percentile(lag, 95) if lag else None,
+            "ids": {"mapped": self.ids.mapped, "unmapped": self.ids.unmapped},
+            "mismatches": len(self.mismatches),
+            "endpoints": endpoints,
+            "mismatch_samples": self.mismatches[:50],
+        }
+
+async def replay(args) -> dict:
+    capture = Capture(args.capture)
+    if args.url:
+        clients = {name: httpx.AsyncClient(base_url=url, timeout=60) for name, url in args.url.items()}
+        try:
+            replayer = Replayer(clients, args)
+            elapsed = await replayer.replay(capture)
+        finally:
+            for client in clients.values():
+                await client.aclose()
+    else:
+        options = SimpleNamespace(
+            bcrypt_rounds=args.bcrypt_rounds, sync=False, response_cache="memory", remote_validation=False
+        )
+        async with Cluster(options) as cluster:
+            replayer = Replayer(cluster.clients, args)
+            elapsed = await replayer.replay(capture)
+    return replayer.summary(elapsed, capture.skipped)
+
+def parse_urls(values) -> Dict[str, str]:
+    urls = {}
+    for value in values or []:
+        name, _, url = value.partition("=")
+        urls[name] = url
+    if urls and set(urls) != {"auth", "listings", "messaging"}:
+        raise SystemExit("--url needs auth=, listings= and messaging=")
+    return urls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="JSONL capture file")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay N times faster; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=20, help="most requests in flight at once")
+    parser.add_argument("--url", action="append", metavar="SERVICE=URL", help="replay against a running stack")
+    parser.add_argument("--id-timeout", type=float, default=10, help="seconds to wait for an id being created")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="for the in-process auth-service")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+    args.url = parse_urls(args.url)
+
+    summary = asyncio.run(replay(args))
+    print(f"{summary['replayed']} requests replayed in {summary['elapsed_seconds']}s "
+          f"({summary['throughput_rps']} req/s), {summary['skipped_lines']} lines skipped, "
+          f"ids mapped {summary['ids']['mapped']} / unmapped {summary['ids']['unmapped']}")
+    if summary["schedule_lag_p95_ms"] is not None:
+        print(f"p95 lag behind the captured schedule: {summary['schedule_lag_p95_ms']} ms")
+    print(f"  {'request':<42}{'reqs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for label, stats in summary["endpoints"].items():
+        print(f"  {label:<42}{stats['requests']:>6}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}  {stats['statuses']}")
+    print(f"{summary['mismatches']} mismatches")
+    for mismatch in summary["mismatch_samples"][:10]:
+        print(f"  line {mismatch['line']}: {mismatch['request']}: {mismatch['problem']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
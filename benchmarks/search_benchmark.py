@@ -0,0 +1,146 @@
+"""Compare listing search latency: full-text index vs the old ILIKE scan.
+
+    python benchmarks/search_benchmark.py --sizes 10000 100000 1000000
+
+Full-text is timed twice: newest first (the default), and ranked by relevance
+(?sort=relevance), which has to score every match before it can pick a page.
+
+Each size is seeded into a fresh SQLite database (FTS5) unless --database-url
+points at a Postgres database, whose listings table is dropped and re-created.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from service_loader import load_service
+
+COMMON_WORDS = [
+    "calculus", "textbook", "chemistry", "physics", "biology", "desk", "lamp", "chair",
+    "laptop", "charger", "monitor", "keyboard", "bike", "helmet", "lock", "jacket",
+    "hoodie", "wolfpack", "dorm", "fridge", "microwave", "calculator", "backpack", "shoes",
+]
+QUERIES = ["calculus", "calc", "laptop charger", "wolfpack hoodie", "microw", "word1234", "desk lamp chair"]
+BATCH_SIZE = 10000
+
+def random_text(rng, n_words):
+    words = []
+    for _ in range(n_words):
+        if rng.random() < 0.3:
+            words.append(rng.choice(COMMON_WORDS))
+        else:
+            words.append(f"word{rng.randrange(50000)}")
+    return " ".join(words)
+
+def seed(listings, size, rng):
+    models = listings.models
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    categories = list(models.ListingCategory)
+
+    def insert_batch(start, count):
+        rows = [{
+            "title": random_text(rng, rng.randint(3, 6)),
+            "description": random_text(rng, rng.randint(15, 40)),
+            "price": round(rng.uniform(1, 1000), 2),
+            "category": rng.choice(categories),
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": f"seller{i % 500}@ncsu.edu",
+            "seller_id": i % 500,
+            "images": [],
+            "created_at": base + timedelta(seconds=i),
+        } for i in range(start, start + count)]
+
+        def run(connection):
+            connection.execute(models.Listing.__table__.insert(), rows)
+        return run
+
+    async def go():
+        for start in range(0, size, BATCH_SIZE):
+            await listings.database.run_in_transaction(insert_batch(start, min(BATCH_SIZE, size - start)))
+    return go()
+
+async def time_queries(listings, backend, repeat, limit, sort="newest"):
+    search = listings.search.listing_search
+    installed, search.backend = search.backend, backend
+    timings = {}
+    try:
+        for query in QUERIES:
+            samples = []
+            for _ in range(repeat):
+                async with listings.database.SessionLocal() as db:
+                    service = listings.service.ListingService(db)
+                    filters = listings.schemas.ListingFilters(search=query, sort=sort)
+                    start = time.perf_counter()
+                    await service.get_listings_page(filters, limit)
+                    samples.append((time.perf_counter() - start) * 1000)
+            timings[query] = {
+                "p50_ms": round(statistics.median(samples), 3),
+                "max_ms": round(max(samples), 3),
+            }
+    finally:
+        search.backend = installed
+    return timings
+
+async def run_size(size, args, rng):
+    env = {"DATABASE_URL": args.database_url or f"sqlite:///{tempfile.mkdtemp()}/search_bench.db"}
+    listings = load_service("listings-service", env)
+
+    if args.database_url:
+        def reset(connection):
+            connection.exec_driver_sql("DROP TABLE IF EXISTS listings CASCADE")
+        await listings.database.run_in_transaction(reset)
+
+    async with listings.main.app.router.lifespan_context(listings.main.app):
+        fulltext = listings.search.listing_search.backend
+        started = time.perf_counter()
+        await seed(listings, size, rng)
+        seed_seconds = time.perf_counter() - started
+
+        result = {"rows": size, "seed_seconds": round(seed_seconds, 2), "fulltext_backend": fulltext}
+        result["ilike"] = await time_queries(listings, "ilike", args.repeat, args.limit)
+        if fulltext != "ilike":
+            result["fulltext"] = await time_queries(listings, fulltext, args.repeat, args.limit)
+            result["fulltext_ranked"] = await time_queries(listings, fulltext, args.repeat, args.limit, "relevance")
+
+    await listings.database.engine.dispose()
+    return result
+
+def print_table(result):
+    print(f"\n{result['rows']:,} rows (seeded in {result['seed_seconds']}s, full-text: {result['fulltext_backend']})")
+    print(f"  {'query':<20}{'ilike p50 ms':>15}{'fulltext p50 ms':>18}{'speed-up':>10}{'ranked p50 ms':>16}")
+    for query, ilike in result["ilike"].items():
+        fulltext = result.get("fulltext", {}).get(query)
+        if fulltext:
+            ranked = result["fulltext_ranked"][query]
+            speedup = ilike["p50_ms"] / fulltext["p50_ms"] if fulltext["p50_ms"] else float("inf")
+            print(f"  {query:<20}{ilike['p50_ms']:>15}{fulltext['p50_ms']:>18}{speedup:>9.1f}x{ranked['p50_ms']:>16}")
+        else:
+            print(f"  {query:<20}{ilike['p50_ms']:>15}{'-':>18}{'-':>10}{'-':>16}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20, help="page size per query")
+    parser.add_argument("--database-url", help="Postgres URL to benchmark instead of SQLite")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for size in args.sizes:
+        result = asyncio.run(run_size(size, args, rng))
+        print_table(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Compare list response serialization: ORM + response_model vs FAST_RESPONSES.
+
+    python benchmarks/serialization_benchmark.py --sizes 100 1000 10000
+
+Each size seeds fresh SQLite databases with that many listings, conversations and
+messages, then requests the unpaged listings list, the inbox and one conversation's
+messages through the real apps with both settings. CPU time per request is measured
+with time.process_time, and both modes must return the same JSON.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from service_loader import load_service
+
+USER_ID = 1
+
+def seed_listings(listings, size):
+    models = listings.models
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    categories = list(models.ListingCategory)
+
+    def run(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"Listing {i}",
+            "description": f"Description of listing {i} " * 4,
+            "price": round(1 + i % 997 * 1.01, 2),
+            "category": categories[i % len(categories)],
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": f"seller{i % 50}@ncsu.edu",
+            "seller_id": i % 50,
+            "images": [f"https://img.example/{i}.jpg"],
+            "created_at": base + timedelta(seconds=i),
+        } for i in range(size)])
+    return run
+
+def seed_messaging(messaging, size):
+    models = messaging.models
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def run(connection):
+        connection.execute(models.Conversation.__table__.insert(), [{
+            "id": i + 1,
+            "listing_id": i + 1,
+            "buyer_id": USER_ID,
+            "buyer_email": "buyer@ncsu.edu",
+            "seller_id": i + 2,
+            "seller_email": "seller@ncsu.edu",
+            "listing_title": f"Listing {i + 1}",
+            "is_active": True,
+            "created_at": base + timedelta(minutes=i),
+            "updated_at": base + timedelta(minutes=i),
+        } for i in range(size)])
+        # One message in every conversation, the rest all in conversation 1
+        connection.execute(models.Message.__table__.insert(), [{
+            "conversation_id": i + 1 if i < size else 1,
+            "sender_id": USER_ID,
+            "sender_email": "buyer@ncsu.edu",
+            "content": f"message {i}",
+            "is_read": True,
+            "created_at": base + timedelta(seconds=i),
+        } for i in range(size * 2 - 1)])
+    return run
+
+async def measure(app, settings, path, repeat):
+    """CPU ms per request in each mode, plus whether both modes returned the same JSON"""
+    timings, bodies = {}, {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, fast in (("default", False), ("fast", True)):
+            settings.fast_responses = fast
+            samples = []
+            for _ in range(repeat):
+                start = time.process_time()
+                response = await client.get(path)
+                samples.append((time.process_time() - start) * 1000)
+                response.raise_for_status()
+            timings[mode] = round(statistics.median(samples), 2)
+            bodies[mode] = response.json()
+    settings.fast_responses = False
+    timings["speedup"] = round(timings["default"] / timings["fast"], 2) if timings["fast"] else None
+    timings["same_output"] = bodies["default"] == bodies["fast"]
+    return timings
+
+async def run_size(size, args):
+    result = {"rows": size}
+
+    listings = load_service("listings-service", {
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/serialization_bench.db",
+        "RESPONSE_CACHE_BACKEND": "off",
+    })
+    async with listings.main.app.router.lifespan_context(listings.main.app):
+        await listings.database.run_in_transaction(seed_listings(listings, size))
+        result["listings"] = await measure(listings.main.app, listings.config.settings, "/v1/listings/", args.repeat)
+    await listings.database.engine.dispose()
+
+    messaging = load_service("messaging-service", {
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/serialization_bench.db",
+    })
+    app = messaging.main.app
+    app.dependency_overrides[messaging.controller.get_current_user] = lambda: {"user_id": USER_ID, "email": "buyer@ncsu.edu"}
+    async with app.router.lifespan_context(app):
+        await messaging.database.run_in_transaction(seed_messaging(messaging, size))
+        async with messaging.database.SessionLocal() as db:
+            await messaging.service.MessagingService(db).reconcile_counters()
+        settings = messaging.config.settings
+        result["inbox"] = await measure(app, settings, "/v1/conversations/", args.repeat)
+        result["messages"] = await measure(app, settings, "/v1/conversations/1/messages", args.repeat)
+    await messaging.database.engine.dispose()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<10}{'rows':>8}{'default cpu ms':>16}{'fast cpu ms':>13}{'speed-up':>10}{'same':>6}")
+    results = []
+    for size in args.sizes:
+        result = asyncio.run(run_size(size, args))
+        for endpoint in ("listings", "inbox", "messages"):
+            timing = result[endpoint]
+            print(f"{endpoint:<10}{size:>8}{timing['default']:>16}{timing['fast']:>13}"
+                  f"{timing['speedup']:>9}x{'yes' if timing['same_output'] else 'NO':>6}")
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Shared setup for the local test_*.py checks that run services in-process.
+
+    from service_fixtures import service_env, token, stub_client
+
+service_env() gives a service a fresh SQLite database and the shared JWT secret,
+token() signs access tokens the services verify locally, and stub_client() is an
+upstream on an httpx.MockTransport that already answers auth-service's
+revocation sync.
+"""
+import tempfile
+import time
+import uuid
+from typing import Callable, Optional
+import httpx
+from jose import jwt
+
+JWT_SECRET = "local-checks"
+REVOCATIONS_PATH = "/v1/auth/revocations"
+
+def service_env(service: str) -> dict:
+    """Settings for load_service: a new SQLite database, async sessions and JWT_SECRET; add whatever else a check needs"""
+    return {
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/{service}.db",
+        "DATABASE_ASYNC": "true",
+        "JWT_SECRET": JWT_SECRET,
+        "JWT_ALGORITHM": "HS256",
+    }
+
+def token(user_id: int, email: Optional[str] = None, secret: str = JWT_SECRET) -> str:
+    """An access token like auth-service issues, valid for ten minutes"""
+    email = email or f"user{user_id}@ncsu.edu"
+    return jwt.encode({
+        "sub": email,
+        "user_id": user_id,
+        "username": email.split("@")[0],
+        "jti": uuid.uuid4().hex,
+        "exp": int(time.time()) + 600,
+    }, secret, algorithm="HS256")
+
+def bearer(user_id: int, email: Optional[str] = None) -> dict:
+    return {"Authorization": f"Bearer {token(user_id, email)}"}
+
+def stub_upstream(handler: Optional[Callable[[httpx.Request], httpx.Response]] = None):
+    """A MockTransport handler with nothing revoked; other requests go to handler, or get 404 without one"""
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == REVOCATIONS_PATH:
+            return httpx.Response(200, json={"revoked": [], "until": "2024-01-01T00:00:00"})
+        if handler is not None:
+            return handler(request)
+        return httpx.Response(404, json={"detail": "Not found"})
+    return handle
+
+def stub_client(base_url: str, handler: Optional[Callable[[httpx.Request], httpx.Response]] = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(stub_upstream(handler)), base_url=base_url)
@@ -0,0 +1,36 @@
+"""Import a service's flat modules in-process so benchmarks can drive the real code.
+
+Every service uses the same module names (config, database, models, ...), so each
+load imports with the service directory first on sys.path and then drops those
+names from sys.modules again; the returned namespace keeps the loaded modules.
+The env overrides only apply while the modules import, which is when each
+service reads its settings, so one load's configuration never leaks into the next.
+"""
+import importlib
+import os
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_service(service: str, env: dict, modules=("main",)) -> types.SimpleNamespace:
+    saved = dict(os.environ)
+    os.environ.update(env)
+    service_dir = os.path.join(REPO_ROOT, service)
+    names = [f[:-3] for f in os.listdir(service_dir) if f.endswith(".py")]
+
+    for name in names:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, service_dir)
+    try:
+        for module in modules:
+            importlib.import_module(module)
+        loaded = {name: sys.modules[name] for name in names if name in sys.modules}
+    finally:
+        sys.path.remove(service_dir)
+        for name in names:
+            sys.modules.pop(name, None)
+        os.environ.clear()
+        os.environ.update(saved)
+
+    return types.SimpleNamespace(**loaded)
@@ -0,0 +1,143 @@
+"""Break the slowest traced requests down into their spans, across every service.
+
+    python benchmarks/trace_breakdown.py traces/*.jsonl --top 5
+    python benchmarks/trace_breakdown.py traces/*.jsonl --route "/v1/conversations/" --min-ms 250
+    python benchmarks/trace_breakdown.py traces/*.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+Reads the JSONL files written by TRACING_EXPORTER=file, joins spans by trace id
+and prints each selected trace as a tree. Every line shows the span's duration,
+its self time (duration not covered by any child span) and where it started
+relative to the root, so the time of a slow request can be attributed to the
+handler, its DB session and queries, or the upstream calls it waited on.
+"""
+import argparse
+import json
+from collections import defaultdict
+
+# Spans the lifetime of a DB session alongside the handler's own work rather than containing it,
+# so they don't count against anyone's self time
+OVERLAY_SPANS = {"db.session"}
+
+def load_spans(paths):
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    span = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if span.get("duration_ms") is not None:
+                    traces[span["trace_id"]].append(span)
+    return traces
+
+def covered_ms(intervals):
+    """Total length of the union of (start, end) intervals"""
+    total, reach = 0.0, None
+    for start, end in sorted(intervals):
+        if reach is None or start > reach:
+            total += end - start
+            reach = end
+        elif end > reach:
+            total += end - reach
+            reach = end
+    return total
+
+def build_tree(spans):
+    by_id = {span["span_id"]: span for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        # A parent that was never exported (e.g. an unsampled or external caller) makes its child a root
+        if span["parent_id"] in by_id:
+            children[span["parent_id"]].append(span)
+        else:
+            roots.append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["start_time"])
+    roots.sort(key=lambda span: span["start_time"])
+    return roots, children
+
+def self_ms(span, children):
+    start = span["start_time"]
+    end = start + span["duration_ms"] / 1000
+    intervals = [
+        (max(child["start_time"], start), min(child["start_time"] + child["duration_ms"] / 1000, end))
+        for child in children.get(span["span_id"], []) if child["name"] not in OVERLAY_SPANS
+    ]
+    busy = covered_ms([(a, b) for a, b in intervals if b > a]) * 1000
+    return max(span["duration_ms"] - busy, 0.0)
+
+def describe(span):
+    attributes = span.get("attributes") or {}
+    if span["name"] == "db.query":
+        return "db.query " + attributes.get("db.statement", "")[:90]
+    label = span["name"]
+    status = attributes.get("http.status_code")
+    if status is not None:
+        label += f" -> {status}"
+    if span.get("error"):
+        label += f" !{span['error']}"
+    return label
+
+def print_tree(span, children, origin, depth=0):
+    offset = (span["start_time"] - origin) * 1000
+    own = "-" if span["name"] in OVERLAY_SPANS else f"{self_ms(span, children):.1f}"
+    print(
+        f"{span['duration_ms']:>10.1f}{own:>10}{offset:>10.1f}  "
+        f"{'  ' * depth}[{span['service']}] {describe(span)}"
+    )
+    for child in children.get(span["span_id"], []):
+        print_tree(child, children, origin, depth + 1)
+
+def summarize(spans, children):
+    """Self time per service and span kind, i.e. where the trace's wall time went"""
+    totals = defaultdict(float)
+    for span in spans:
+        if span["name"] in OVERLAY_SPANS:
+            continue
+        kind = "db" if span["name"].startswith("db.") else span["kind"]
+        totals[(span["service"], kind)] += self_ms(span, children)
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="span files written by the file exporter")
+    parser.add_argument("--top", type=int, default=3, help="how many of the slowest traces to show")
+    parser.add_argument("--trace", help="show only this trace id")
+    parser.add_argument("--route", help="only traces whose root server span has this route template")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="only traces whose root took at least this long")
+    args = parser.parse_args()
+
+    selected = []
+    for trace_id, spans in load_spans(args.files).items():
+        if args.trace and trace_id != args.trace:
+            continue
+        roots, children = build_tree(spans)
+        root = max(roots, key=lambda span: span["duration_ms"])
+        if args.route and (root.get("attributes") or {}).get("http.route") != args.route:
+            continue
+        if root["duration_ms"] < args.min_ms:
+            continue
+        selected.append((root["duration_ms"], trace_id, spans, roots, children))
+
+    selected.sort(key=lambda item: -item[0])
+    if not selected:
+        print("no matching traces")
+        return
+    for duration, trace_id, spans, roots, children in selected[:args.top]:
+        print(f"trace {trace_id}  {duration:.1f} ms  {len(spans)} spans")
+        print(f"{'total ms':>10}{'self ms':>10}{'at ms':>10}  span")
+        origin = roots[0]["start_time"]
+        for root in roots:
+            print_tree(root, children, origin)
+        print("  self time by service:")
+        for (service, kind), ms in summarize(spans, children):
+            print(f"    {service:<20}{kind:<10}{ms:>10.1f} ms")
+        print()
+
+if __name__ == "__main__":
+    main()
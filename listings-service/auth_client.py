@@ -1,25 +1,68 @@
+import hashlib
+import time
 import httpx
 from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from cache import TTLCache
 from config import settings
+from http_clients import clients
+from token_verifier import token_verifier
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _seconds_until_expiry(token: str) -> float:
+    """Remaining lifetime of the token, so cached validations never outlive it"""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        exp = None
+    if exp is None:
+        return settings.token_cache_ttl_seconds
+    return exp - time.time()
+
+def _validation_ttl(token: str) -> float:
+    """Reuse a /validate result no longer than local verification goes between revocation syncs, so logouts apply as fast"""
+    return min(_seconds_until_expiry(token), settings.token_revocation_sync_seconds)
 
 class AuthClient:
+    _token_cache = TTLCache(
+        maxsize=settings.token_cache_size,
+        ttl=settings.token_cache_ttl_seconds
+    )
+
     @staticmethod
     async def validate_token(token: str):
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{settings.auth_service_url}/v1/auth/validate",
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Invalid token"
-                    )
-            except httpx.RequestError:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail="Authentication service unavailable"
-                )
\ No newline at end of file
+        user_info = await token_verifier.verify(token)
+        if user_info is not None:
+            return user_info
+        
+        return await AuthClient._token_cache.get_or_load(
+            _token_key(token),
+            lambda: AuthClient._fetch_user_info(token),
+            ttl=lambda _: _validation_ttl(token)
+        )
+
+    @staticmethod
+    async def _fetch_user_info(token: str):
+        try:
+            response = await clients.get("auth").get(
+                "/v1/auth/validate",
+                headers={"Authorization": f"Bearer {token}"}
+            )
+        except httpx.RequestError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service unavailable"
+            )
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+
+    @staticmethod
+    def cache_stats() -> dict:
+        return AuthClient._token_cache.stats()
@@ -1,8 +1,76 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
+from typing import List, Optional
 
 class Settings(BaseSettings):
     database_url: str
+    # AsyncEngine/AsyncSession by default; false falls back to the sync engine in a threadpool
+    database_async: bool = True
+    # Connection pool per worker (ignored for SQLite)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     auth_service_url: str = "http://localhost:8001"
+    # Listing update/delete events go to messaging-service so it can drop cached lookups
+    messaging_service_url: Optional[str] = None
+    listing_events_secret: Optional[str] = None
+    # List endpoints select plain column rows, validate them in bulk and encode with orjson
+    fast_responses: bool = False
+    listings_page_size: int = 20
+    listings_max_page_size: int = 100
+    # Rendered public GET responses: "memory" (per worker), "redis" (shared via REDIS_URL) or "off"
+    response_cache_backend: str = "memory"
+    response_cache_size: int = 1000
+    response_cache_ttl_seconds: int = 60
+    # Cache-Control max-age sent to clients and proxies
+    response_cache_max_age: int = 10
+    redis_url: Optional[str] = None
+    # GET /v1/listings/facets: lower edges of the price histogram buckets, and a shorter cache TTL
+    facets_price_edges: List[float] = [0, 10, 25, 50, 100, 250, 500, 1000]
+    facets_cache_ttl_seconds: int = 10
+    # "auto" uses Postgres tsvector/GIN or SQLite FTS5 when available; "ilike" forces the old scan
+    search_backend: str = "auto"
+    # Shared with auth-service so tokens can be verified locally; unset falls back to /validate
+    jwt_secret: Optional[str] = None
+    jwt_algorithm: str = "HS256"
+    token_revocation_sync_seconds: int = 30
+    # Remote /validate results, bounded by LRU size and never kept past the token's exp or TOKEN_REVOCATION_SYNC_SECONDS
+    token_cache_size: int = 10000
+    token_cache_ttl_seconds: int = 300
+    # Pooled clients for upstream calls; <upstream>_* settings override the http_* defaults
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 2.0
+    http_read_timeout: float = 5.0
+    http_http2: bool = False
+    auth_service_max_connections: Optional[int] = None
+    auth_service_max_keepalive_connections: Optional[int] = None
+    auth_service_connect_timeout: Optional[float] = None
+    auth_service_read_timeout: Optional[float] = None
+    auth_service_http2: Optional[bool] = None
+    # GET /metrics, per-request query counts, N+1 warnings and the slow-query log; nothing is hooked when off
+    metrics_enabled: bool = False
+    slow_query_ms: float = 200.0
+    n_plus_one_threshold: int = 10
+    # Spans for requests, DB sessions/queries and upstream calls, propagated with W3C traceparent; "memory" or "file"
+    tracing_exporter: str = "off"
+    tracing_file: str = "traces.jsonl"
+    tracing_sample_rate: float = 1.0
+    tracing_service_name: str = "listings-service"
+    # POST /debug/profile runs a sampling profiler for callers sending this in X-Profiler-Token; no route when unset
+    profiler_token: Optional[str] = None
+    profiler_max_seconds: float = 60.0
+    profiler_max_requests: int = 1000
+    
+    @field_validator("facets_price_edges")
+    @classmethod
+    def check_price_edges(cls, edges: List[float]) -> List[float]:
+        if len(edges) < 2 or any(low >= high for low, high in zip(edges, edges[1:])):
+            raise ValueError("needs at least two edges in strictly increasing order")
+        return edges
     
     class Config:
         env_file = ".env"
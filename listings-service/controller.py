@@ -1,41 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from schemas import ListingCreate, ListingUpdate, ListingResponse, ListingFilters
+from schemas import (
+    ListingCreate, ListingUpdate, ListingResponse, ListingFilters, ListingPage, ListingSummary, ListingSummaryPage, ListingFacets
+)
 from models import ListingCategory, ListingStatus
-from service import ListingService
+from service import ListingService, parse_ids
 from auth_client import AuthClient
+from events import listing_events
+from response_cache import response_cache, listing_scope, LISTS_SCOPE
+from config import settings
+from pydantic import TypeAdapter
 import json
-from typing import List, Optional
+import orjson
+from typing import List, Optional, Union
 
 router = APIRouter(prefix="/v1/listings", tags=["listings"])
 security = HTTPBearer()
 
+LISTING_ADAPTER = TypeAdapter(ListingResponse)
+LISTINGS_ADAPTER = TypeAdapter(List[ListingResponse])
+PAGE_ADAPTER = TypeAdapter(ListingPage)
+FACETS_ADAPTER = TypeAdapter(ListingFacets)
+# ?fields= -> (list adapter, page adapter)
+PROJECTION_ADAPTERS = {
+    "summary": (TypeAdapter(List[ListingSummary]), TypeAdapter(ListingSummaryPage)),
+    "detail": (LISTINGS_ADAPTER, PAGE_ADAPTER),
+}
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     user_info = await AuthClient.validate_token(credentials.credentials)
     return user_info
 
-def parse_images(listing):
-    """Parse images JSON string to list"""
-    if listing.images:
-        try:
-            listing.images = json.loads(listing.images)
-        except json.JSONDecodeError:
-            listing.images = []
-    else:
-        listing.images = []
-    return listing
+def render_json(adapter: TypeAdapter, value) -> bytes:
+    validated = adapter.validate_python(value, from_attributes=True)
+    if settings.fast_responses:
+        return orjson.dumps(adapter.dump_python(validated), option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return adapter.dump_json(validated)
+
+def as_dicts(listings: list) -> list:
+    """Projected Rows as plain dicts, which pydantic validates much faster; ORM instances pass through"""
+    if not listings or not isinstance(listings[0], Row):
+        return listings
+    keys = listings[0]._fields
+    return [dict(zip(keys, row)) for row in listings]
 
-@router.get("/", response_model=List[ListingResponse])
+def listings_cache_key(
+    filters: ListingFilters, limit: Optional[int], cursor: Optional[str], fields: Optional[str]
+) -> str:
+    """Same key for the same query however its parameters were spelled or ordered"""
+    params = filters.model_dump(mode="json", exclude_none=True)
+    params.update(limit=limit, cursor=cursor, fields=fields)
+    return json.dumps(params, sort_keys=True)
+
+@router.get(
+    "/",
+    response_model=Union[ListingPage, List[ListingResponse], ListingSummaryPage, List[ListingSummary]]
+)
 async def get_listings(
+    request: Request,
     category: Optional[ListingCategory] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     status: Optional[ListingStatus] = ListingStatus.AVAILABLE,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    sort: str = Query("newest", pattern="^(newest|relevance)$", description="relevance ranks ?search= matches"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.listings_max_page_size),
+    cursor: Optional[str] = None,
+    ids: Optional[str] = Query(None, description="Comma-separated listing ids; other filters are ignored"),
+    fields: Optional[str] = Query(None, pattern="^(summary|detail)$", description="Read-only column projection"),
+    db: AsyncSession = Depends(get_db)
 ):
+    listing_service = ListingService(db)
+    # Fast responses always take the read-only path; detail has the same shape as the ORM response
+    projection = fields or ("detail" if settings.fast_responses else None)
+    list_adapter, page_adapter = PROJECTION_ADAPTERS[projection or "detail"]
+    
+    # Batch lookup for other services hydrating many listings at once
+    if ids is not None:
+        listing_ids = parse_ids(ids, settings.listings_max_page_size)
+        
+        async def render_batch():
+            listings = await listing_service.get_listings_by_ids(listing_ids, projection)
+            return render_json(list_adapter, as_dicts(listings))
+        
+        key = "ids:" + ",".join(str(listing_id) for listing_id in listing_ids) + (f":{fields}" if fields else "")
+        return await response_cache.respond(request, LISTS_SCOPE, key, render_batch)
+    
+    filters = ListingFilters(
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        status=status,
+        search=search,
+        sort=sort
+    )
+    
+    # Without limit/cursor, existing clients keep getting the full, unwrapped list
+    if limit is None and cursor is None:
+        async def render():
+            listings = await listing_service.get_listings(filters, projection)
+            return render_json(list_adapter, as_dicts(listings))
+    else:
+        limit = limit or settings.listings_page_size
+        
+        async def render():
+            listings, next_cursor = await listing_service.get_listings_page(filters, limit, cursor, projection)
+            return render_json(page_adapter, {
+                "items": as_dicts(listings),
+                "next_cursor": next_cursor
+            })
+    
+    return await response_cache.respond(request, LISTS_SCOPE, listings_cache_key(filters, limit, cursor, fields), render)
+
+@router.get("/facets", response_model=ListingFacets)
+async def get_listing_facets(
+    request: Request,
+    category: Optional[ListingCategory] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    status: Optional[ListingStatus] = ListingStatus.AVAILABLE,
+    search: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Counts for filter sidebars, for the same filters as GET /v1/listings/"""
     filters = ListingFilters(
         category=category,
         min_price=min_price,
@@ -44,57 +134,64 @@ async def get_listings(
         search=search
     )
     
-    listing_service = ListingService(db)
-    listings = listing_service.get_listings(filters)
+    async def render():
+        facets = await ListingService(db).get_facets(filters, settings.facets_price_edges)
+        return render_json(FACETS_ADAPTER, facets)
     
-    # Parse images for each listing
-    parsed_listings = [parse_images(listing) for listing in listings]
-    return parsed_listings
+    key = "facets:" + listings_cache_key(filters, None, None, None)
+    return await response_cache.respond(request, LISTS_SCOPE, key, render, ttl=settings.facets_cache_ttl_seconds)
 
 @router.post("/", response_model=ListingResponse)
 async def create_listing(
     listing_data: ListingCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     listing_service = ListingService(db)
-    listing = listing_service.create_listing(
+    listing = await listing_service.create_listing(
         listing_data, 
         current_user["email"], 
         current_user["user_id"]
     )
-    return parse_images(listing)
+    return listing
 
 @router.get("/{listing_id}", response_model=ListingResponse)
-async def get_listing(listing_id: int, db: Session = Depends(get_db)):
-    listing_service = ListingService(db)
-    listing = listing_service.get_listing_by_id(listing_id)
-    
-    if not listing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
-        )
+async def get_listing(listing_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def render():
+        listing_service = ListingService(db)
+        listing = await listing_service.get_listing_by_id(listing_id)
+        
+        if not listing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Listing not found"
+            )
+        
+        return render_json(LISTING_ADAPTER, listing)
     
-    return parse_images(listing)
+    return await response_cache.respond(request, listing_scope(listing_id), "detail", render)
 
 @router.patch("/{listing_id}", response_model=ListingResponse)
 async def update_listing(
     listing_id: int,
     listing_update: ListingUpdate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     listing_service = ListingService(db)
-    listing = listing_service.update_listing(listing_id, listing_update, current_user["email"])
-    return parse_images(listing)
+    listing = await listing_service.update_listing(listing_id, listing_update, current_user["email"])
+    background_tasks.add_task(listing_events.publish, "listing.updated", listing_id)
+    return listing
 
 @router.delete("/{listing_id}")
 async def delete_listing(
     listing_id: int,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     listing_service = ListingService(db)
-    listing_service.delete_listing(listing_id, current_user["email"])
+    await listing_service.delete_listing(listing_id, current_user["email"])
+    background_tasks.add_task(listing_events.publish, "listing.deleted", listing_id)
     return {"message": "Listing deleted successfully"}
\ No newline at end of file
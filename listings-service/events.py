@@ -0,0 +1,30 @@
+import logging
+import httpx
+from config import settings
+from http_clients import clients
+
+logger = logging.getLogger(__name__)
+
+class ListingEvents:
+    """Best-effort notifications to messaging-service; its cache TTL covers any that are lost"""
+
+    async def publish(self, event_type: str, listing_id: int):
+        if not clients.configured("messaging"):
+            return
+
+        headers = {}
+        if settings.listing_events_secret:
+            headers["X-Listing-Events-Secret"] = settings.listing_events_secret
+        try:
+            response = await clients.get("messaging").post(
+                "/internal/listing-events",
+                json={"type": event_type, "listing_id": listing_id},
+                headers=headers
+            )
+        except httpx.RequestError as exc:
+            logger.warning("Could not deliver %s for listing %s: %s", event_type, listing_id, exc)
+            return
+        if response.status_code >= 400:
+            logger.warning("messaging-service rejected %s for listing %s: %s", event_type, listing_id, response.status_code)
+
+listing_events = ListingEvents()
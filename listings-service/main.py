@@ -1,13 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from instrumentation import instrument
+from tracing import install_tracing
+from profiling import install_profiler
 from controller import router
-from database import Base, engine
+from http_clients import clients
+from database import engine, init_db, pool_status, run_in_transaction
+from search import listing_search
+from auth_client import AuthClient
+from response_cache import response_cache
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await run_in_transaction(listing_search.detect)
+    await clients.startup()
+    yield
+    await clients.shutdown()
 
-app = FastAPI(title="NCSU Marketplace - Listings Service", version="1.0.0")
+app = FastAPI(title="NCSU Marketplace - Listings Service", version="1.0.0", lifespan=lifespan)
 
 app.include_router(router)
+instrument(app, engine)
+install_profiler(app)
 
 @app.get("/")
 async def root():
@@ -15,4 +30,14 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/db")
+async def database_pool_status():
+    return pool_status()
+
+@app.get("/health/cache")
+async def cache_stats():
+    return {"token_cache": AuthClient.cache_stats(), "response_cache": response_cache.stats()}
+
+install_tracing(app, engine)
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""initial schema: listings
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+LISTING_STATUS = ("AVAILABLE", "SOLD", "PENDING")
+LISTING_CATEGORY = ("TEXTBOOKS", "ELECTRONICS", "FURNITURE", "CLOTHING", "SPORTS", "OTHER")
+
+def upgrade():
+    # Databases created by the old create_all() startup already have the table
+    if sa.inspect(op.get_bind()).has_table("listings"):
+        return
+
+    op.create_table(
+        "listings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("category", sa.Enum(*LISTING_CATEGORY, name="listingcategory"), nullable=False),
+        sa.Column("status", sa.Enum(*LISTING_STATUS, name="listingstatus")),
+        sa.Column("seller_email", sa.String(), nullable=False),
+        sa.Column("seller_id", sa.Integer(), nullable=False),
+        sa.Column("location", sa.String()),
+        sa.Column("images", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_listings_id", "listings", ["id"])
+
+def downgrade():
+    op.drop_table("listings")
+    sa.Enum(name="listingstatus").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="listingcategory").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,73 @@
+"""full-text search: tsvector/GIN on Postgres, FTS5 on SQLite
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+POSTGRES_UPGRADE = [
+    """
+    ALTER TABLE listings ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_listings_search_vector ON listings USING GIN (search_vector)",
+]
+
+# External-content FTS5 table kept in sync with listings by triggers
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+        title, description, content='listings', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_insert AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_delete AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_update AFTER UPDATE OF title, description ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO listings_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')",
+]
+
+def sqlite_has_fts5(bind) -> bool:
+    return bind.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar() == 1
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for statement in POSTGRES_UPGRADE:
+            op.execute(statement)
+    elif bind.dialect.name == "sqlite" and sqlite_has_fts5(bind):
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_listings_search_vector")
+        op.execute("ALTER TABLE listings DROP COLUMN IF EXISTS search_vector")
+    elif bind.dialect.name == "sqlite":
+        for trigger in ("listings_fts_insert", "listings_fts_delete", "listings_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS listings_fts")
@@ -0,0 +1,27 @@
+"""composite indexes for the listing browse, filter and ownership paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Default browse: status = available ORDER BY created_at DESC, id DESC
+    op.create_index("ix_listings_status_created_at", "listings", ["status", "created_at", "id"])
+    # Category pages with the same ordering
+    op.create_index("ix_listings_category_status_created_at", "listings", ["category", "status", "created_at", "id"])
+    # min_price / max_price ranges
+    op.create_index("ix_listings_status_price", "listings", ["status", "price"])
+    op.create_index("ix_listings_seller_email", "listings", ["seller_email"])
+
+def downgrade():
+    op.drop_index("ix_listings_seller_email", table_name="listings")
+    op.drop_index("ix_listings_status_price", table_name="listings")
+    op.drop_index("ix_listings_category_status_created_at", table_name="listings")
+    op.drop_index("ix_listings_status_created_at", table_name="listings")
@@ -0,0 +1,59 @@
+"""store listing images as JSON (JSONB on Postgres) instead of a JSON string in TEXT
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+def normalize(raw):
+    """What the old parse_images made of a stored value: a list of URLs, [] if unreadable"""
+    try:
+        images = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return [str(image) for image in images] if isinstance(images, list) else []
+
+def normalize_rows(bind):
+    # Rewrite NULL, empty and malformed values so every row holds a valid JSON array
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, images FROM listings WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).all()
+        if not rows:
+            return
+        updates = []
+        for listing_id, raw in rows:
+            images = json.dumps(normalize(raw))
+            if raw != images:
+                updates.append({"listing_id": listing_id, "images": images})
+        if updates:
+            bind.execute(sa.text("UPDATE listings SET images = :images WHERE id = :listing_id"), updates)
+        last_id = rows[-1][0]
+
+def upgrade():
+    bind = op.get_bind()
+    normalize_rows(bind)
+    if bind.dialect.name == "postgresql":
+        op.execute("ALTER TABLE listings ALTER COLUMN images TYPE JSONB USING images::jsonb")
+        op.execute("ALTER TABLE listings ALTER COLUMN images SET DEFAULT '[]'::jsonb")
+        op.execute("ALTER TABLE listings ALTER COLUMN images SET NOT NULL")
+    # SQLite stores JSON as text already; recreating the table to change its declared
+    # type would also drop the FTS triggers, so only the data is rewritten there
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE listings ALTER COLUMN images DROP NOT NULL")
+        op.execute("ALTER TABLE listings ALTER COLUMN images DROP DEFAULT")
+        op.execute("ALTER TABLE listings ALTER COLUMN images TYPE TEXT USING images::text")
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Index, JSON, Enum as SQLEnum, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from database import Base
 import enum
+from datetime import datetime, timezone
 
 class ListingStatus(enum.Enum):
     AVAILABLE = "available"
@@ -18,6 +20,13 @@ class ListingCategory(enum.Enum):
 
 class Listing(Base):
     __tablename__ = "listings"
+    # Indexes are created by migrations/versions; declared here so metadata matches the schema
+    __table_args__ = (
+        Index("ix_listings_status_created_at", "status", "created_at", "id"),
+        Index("ix_listings_category_status_created_at", "category", "status", "created_at", "id"),
+        Index("ix_listings_status_price", "status", "price"),
+        Index("ix_listings_seller_email", "seller_email"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -28,6 +37,8 @@ class Listing(Base):
     seller_email = Column(String, nullable=False)
     seller_id = Column(Integer, nullable=False)
     location = Column(String)
-    images = Column(Text)  # JSON string of image URLs
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # List of image URLs
+    images = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list, server_default=text("'[]'"))
+    # Also set client-side so stored values compare exactly against pagination cursors on every backend
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
@@ -0,0 +1,207 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Protocol, Tuple
+from fastapi import Request, Response, status
+from cache import TTLCache
+from config import settings
+
+# Every list, page and ?ids= lookup shares one scope; single listings get their own
+LISTS_SCOPE = "lists"
+
+def listing_scope(listing_id: int) -> str:
+    return f"listing:{listing_id}"
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+class CacheBackend:
+    """Stores rendered responses; a scope's generation is part of every key, so bumping it drops the scope"""
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float):
+        raise NotImplementedError
+
+    async def generation(self, scope: str) -> int:
+        raise NotImplementedError
+
+    async def bump(self, scope: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+class MemoryBackend(CacheBackend):
+    """Per-worker LRU/TTL store; other workers only see a change once their entries expire"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float):
+        self._entries.set(key, entry, ttl)
+
+    async def generation(self, scope: str) -> int:
+        return self._generations.get(scope, 0)
+
+    async def bump(self, scope: str):
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+class ExternalStore(Protocol):
+    """The part of a shared key-value store (e.g. Redis) that ExternalBackend needs"""
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: float): ...
+
+    async def incr(self, key: str) -> int: ...
+
+class FakeExternalStore:
+    """In-process ExternalStore for tests"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Optional[float], bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        expires_at, value = self._values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._values[key] = (time.monotonic() + ttl, value)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._values[key] = (None, str(value).encode())
+        return value
+
+class RedisStore:
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+class ExternalBackend(CacheBackend):
+    """Shares entries and generations between workers through an ExternalStore"""
+
+    def __init__(self, store: ExternalStore, prefix: str = "listings:responses:"):
+        self.store = store
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self.store.get(self.prefix + key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return CachedResponse(body=body, etag=etag.decode())
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float):
+        await self.store.set(self.prefix + key, entry.etag.encode() + b"\n" + entry.body, ttl)
+
+    async def generation(self, scope: str) -> int:
+        return int(await self.store.get(f"{self.prefix}generation:{scope}") or 0)
+
+    async def bump(self, scope: str):
+        await self.store.incr(f"{self.prefix}generation:{scope}")
+
+class ResponseCache:
+    """Rendered JSON responses for public reads, with strong ETags and conditional GET"""
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float, max_age: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def respond(
+        self,
+        request: Request,
+        scope: str,
+        key: str,
+        render: Callable[[], Awaitable[bytes]],
+        ttl: Optional[float] = None
+    ) -> Response:
+        entry = None
+        if self.backend:
+            # Read the generation before rendering so a render racing a write lands under the old one
+            key = f"{scope}:{await self.backend.generation(scope)}:{key}"
+            entry = await self.backend.get(key)
+
+        if entry is None:
+            self.misses += 1
+            body = await render()
+            entry = CachedResponse(body=body, etag=strong_etag(body))
+            if self.backend:
+                await self.backend.set(key, entry, ttl or self.ttl)
+        else:
+            self.hits += 1
+
+        headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={self.max_age}"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def invalidate_listing(self, listing_id: int):
+        """Called after a listing is created, updated or deleted"""
+        if not self.backend:
+            return
+        await self.backend.bump(listing_scope(listing_id))
+        # Any list or batch lookup may include the listing
+        await self.backend.bump(LISTS_SCOPE)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "entries": self.backend.stats() if self.backend else {}
+        }
+
+def create_response_cache() -> ResponseCache:
+    backend = None
+    if settings.response_cache_backend == "memory":
+        backend = MemoryBackend(settings.response_cache_size, settings.response_cache_ttl_seconds)
+    elif settings.response_cache_backend == "redis":
+        backend = ExternalBackend(RedisStore(settings.redis_url))
+    return ResponseCache(backend, settings.response_cache_ttl_seconds, settings.response_cache_max_age)
+
+response_cache = create_response_cache()
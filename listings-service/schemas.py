@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from models import ListingStatus, ListingCategory
 
@@ -37,9 +37,45 @@ class ListingResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ListingSummary(BaseModel):
+    """?fields=summary: what list views show, without the description or seller contact"""
+    id: int
+    title: str
+    price: float
+    category: ListingCategory
+    status: ListingStatus
+    seller_id: int
+    location: Optional[str]
+    images: List[str]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ListingPage(BaseModel):
+    items: List[ListingResponse]
+    next_cursor: Optional[str] = None
+
+class ListingSummaryPage(BaseModel):
+    items: List[ListingSummary]
+    next_cursor: Optional[str] = None
+
 class ListingFilters(BaseModel):
     category: Optional[ListingCategory] = None
     min_price: Optional[float] = None
     max_price: Optional[float] = None
     status: Optional[ListingStatus] = ListingStatus.AVAILABLE
-    search: Optional[str] = None
\ No newline at end of file
+    search: Optional[str] = None
+    # "relevance" ranks search matches; otherwise they come newest first like everything else
+    sort: str = "newest"
+
+class PriceBucket(BaseModel):
+    min: float
+    max: Optional[float]
+    count: int
+
+class ListingFacets(BaseModel):
+    total: int
+    categories: Dict[ListingCategory, int]
+    statuses: Dict[ListingStatus, int]
+    price_histogram: List[PriceBucket]
@@ -0,0 +1,80 @@
+import logging
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import func, inspect, literal_column, or_, select, table
+from models import Listing
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 8
+
+def search_terms(search: str) -> List[str]:
+    return WORD_RE.findall(search.lower())[:MAX_TERMS]
+
+class ListingSearch:
+    """Backs ListingFilters.search with Postgres tsvector/GIN, SQLite FTS5, or ILIKE"""
+
+    def __init__(self):
+        # Stays on ILIKE until detect() has confirmed the index exists
+        self.backend = "ilike"
+
+    def detect(self, connection):
+        """Pick the backend from what the migrations created; takes a sync Connection"""
+        dialect = connection.dialect.name
+        if settings.search_backend == "ilike" or dialect not in ("postgresql", "sqlite"):
+            self.backend = "ilike"
+            return
+
+        columns = inspect(connection).get_columns("listings")
+        if dialect == "postgresql" and any(column["name"] == "search_vector" for column in columns):
+            self.backend = "postgresql"
+        elif dialect == "sqlite" and inspect(connection).has_table("listings_fts"):
+            self.backend = "sqlite"
+        else:
+            # e.g. a Python build without FTS5 skipped the search migration
+            logger.warning("No full-text index on listings, using ILIKE search")
+            self.backend = "ilike"
+
+    def apply(self, query, search: str, ranked: bool = False) -> Tuple[object, Optional[object]]:
+        """Filter query by search; with ranked, also returns a relevance expression (higher is better).
+
+        Ranking scores every match before the first page can be picked, so it is only done on request;
+        unranked, the newest-first index can stop as soon as a page of matches is found.
+        """
+        backend = self.backend
+        terms = search_terms(search)
+
+        if backend == "postgresql" and terms:
+            # Every term must match, each as a prefix
+            ts_query = func.to_tsquery("english", " & ".join(f"{term}:*" for term in terms))
+            search_vector = literal_column("listings.search_vector")
+            query = query.filter(search_vector.op("@@")(ts_query))
+            return query, func.ts_rank(search_vector, ts_query) if ranked else None
+
+        if backend == "sqlite" and terms:
+            fts_query = " ".join(f'"{term}"*' for term in terms)
+            fts_match = literal_column("listings_fts").op("MATCH")(fts_query)
+            if not ranked:
+                # Built once as a rowid set that listings, read in index order, are checked against
+                matching_ids = select(literal_column("rowid")).select_from(table("listings_fts")).where(fts_match)
+                return query.filter(Listing.id.in_(matching_ids)), None
+            matches = select(
+                literal_column("rowid").label("listing_id"),
+                literal_column("bm25(listings_fts)").label("score")
+            ).select_from(table("listings_fts")).where(fts_match).subquery()
+            query = query.join(matches, Listing.id == matches.c.listing_id)
+            # bm25 is lower-is-better
+            return query, -matches.c.score
+
+        search_term = f"%{search}%"
+        query = query.filter(
+            or_(
+                Listing.title.ilike(search_term),
+                Listing.description.ilike(search_term)
+            )
+        )
+        return query, None
+
+listing_search = ListingSearch()
@@ -1,16 +1,64 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from models import Listing
+from sqlalchemy import select, case, func, literal_column, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Listing, ListingCategory, ListingStatus
+from search import listing_search
+from response_cache import response_cache
 from schemas import ListingCreate, ListingUpdate, ListingFilters
 from fastapi import HTTPException, status
+import base64
+import binascii
 import json
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Columns behind each ?fields= projection; "summary" leaves out the description and seller contact
+PROJECTIONS = {
+    "summary": (
+        Listing.id, Listing.title, Listing.price, Listing.category, Listing.status,
+        Listing.seller_id, Listing.location, Listing.images, Listing.created_at
+    ),
+    "detail": tuple(Listing.__table__.columns),
+}
+
+def encode_cursor(listing: Listing, rank: Optional[float] = None) -> str:
+    position = [listing.created_at.isoformat(), listing.id]
+    if rank is not None:
+        position.append(rank)
+    raw = json.dumps(position)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, Optional[float]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, listing_id, *rank = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(listing_id), float(rank[0]) if rank else None
+    except (binascii.Error, ValueError, TypeError, IndexError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def parse_ids(raw: str, max_ids: int) -> List[int]:
+    """Parse a comma-separated ?ids= value, keeping the first occurrence of each id"""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be comma-separated integers"
+        )
+    if len(ids) > max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {max_ids} ids per request"
+        )
+    return ids
 
 class ListingService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def create_listing(self, listing_data: ListingCreate, seller_email: str, seller_id: int) -> Listing:
+    async def create_listing(self, listing_data: ListingCreate, seller_email: str, seller_id: int) -> Listing:
         
         db_listing = Listing(
             title=listing_data.title,
@@ -20,16 +68,22 @@ class ListingService:
             seller_email=seller_email,
             seller_id=seller_id,
             location=listing_data.location,
-            images=images_json
+            images=listing_data.images or []
         )
         self.db.add(db_listing)
-        self.db.commit()
-        self.db.refresh(db_listing)
+        await self.db.commit()
+        await self.db.refresh(db_listing)
+        await response_cache.invalidate_listing(db_listing.id)
         return db_listing
     
-    def get_listings(self, filters: ListingFilters) -> List[Listing]:
-        query = self.db.query(Listing)
-        
+    def _select(self, fields: Optional[str]):
+        # A projection returns read-only, tuple-backed Rows: no ORM hydration or identity-map tracking
+        return select(*PROJECTIONS[fields]) if fields else select(Listing)
+    
+    def _filtered_query(self, filters: ListingFilters, fields: Optional[str] = None):
+        return self._apply_filters(self._select(fields), filters)
+    
+    def _apply_filters(self, query, filters: ListingFilters):
         if filters.category:
             query = query.filter(Listing.category == filters.category)
         
@@ -42,22 +96,120 @@ class ListingService:
         if filters.max_price:
             query = query.filter(Listing.price <= filters.max_price)
         
+        # Full-text match when an index is available; rank is None unless relevance order was asked
+        # for, and on the ILIKE fallback
+        rank = None
         if filters.search:
-            search_term = f"%{filters.search}%"
-            query = query.filter(
-                or_(
-                    Listing.title.ilike(search_term),
-                    Listing.description.ilike(search_term)
-                )
+            query, rank = listing_search.apply(query, filters.search, ranked=filters.sort == "relevance")
+        
+        return query, rank
+    
+    def _ordering(self, rank):
+        order = [Listing.created_at.desc(), Listing.id.desc()]
+        if rank is not None:
+            order.insert(0, rank.desc())
+        return order
+    
+    async def get_listings(self, filters: ListingFilters, fields: Optional[str] = None) -> List[Listing]:
+        """Matching listings; with fields set, Rows of that projection instead of ORM instances"""
+        query, rank = self._filtered_query(filters, fields)
+        result = await self.db.execute(query.order_by(*self._ordering(rank)))
+        return result.all() if fields else result.scalars().all()
+    
+    async def get_listings_page(
+        self, filters: ListingFilters, limit: int, cursor: Optional[str] = None, fields: Optional[str] = None
+    ) -> Tuple[List[Listing], Optional[str]]:
+        """Keyset page, newest (or most relevant) first; returns the rows and the next cursor"""
+        query, rank = self._filtered_query(filters, fields)
+        
+        if cursor:
+            created_at, listing_id, cursor_rank = decode_cursor(cursor)
+            after = or_(
+                Listing.created_at < created_at,
+                and_(Listing.created_at == created_at, Listing.id < listing_id)
             )
+            if rank is not None and cursor_rank is not None:
+                after = or_(rank < cursor_rank, and_(rank == cursor_rank, after))
+            query = query.filter(after)
+        
+        if rank is not None:
+            query = query.add_columns(rank.label("rank"))
+        
+        # One extra row tells us whether another page exists
+        query = query.order_by(*self._ordering(rank)).limit(limit + 1)
+        result = await self.db.execute(query)
+        page = result.all()
+        listings = page if fields else [row[0] for row in page]
+        
+        if len(page) > limit:
+            listings = listings[:limit]
+            last_rank = page[limit - 1].rank if rank is not None else None
+            return listings, encode_cursor(listings[-1], last_rank)
+        return listings, None
+    
+    async def get_facets(self, filters: ListingFilters, price_edges: List[float]) -> dict:
+        """Category, status and price-bucket counts for the filters, from one grouped query.
         
-        return query.order_by(Listing.created_at.desc()).all()
+        Category and status are grouped on rather than filtered, so each facet counts what
+        picking another value would return while every other filter still applies.
+        """
+        # Bucket i holds prices in [price_edges[i], price_edges[i + 1]); the last one is open-ended
+        # Integer literals rather than binds, so the CASE result is typed on every driver
+        bucket = case(
+            *((Listing.price < edge, literal_column(str(index))) for index, edge in enumerate(price_edges[1:])),
+            else_=literal_column(str(len(price_edges) - 1))
+        )
+        grouped_filters = filters.model_copy(update={"category": None, "status": None})
+        query, _ = self._apply_filters(
+            select(Listing.category, Listing.status, bucket.label("bucket")), grouped_filters
+        )
+        # Group in an outer query so Postgres sees identical GROUP BY and SELECT expressions
+        matches = query.subquery()
+        result = await self.db.execute(
+            select(matches.c.category, matches.c.status, matches.c.bucket, func.count())
+            .group_by(matches.c.category, matches.c.status, matches.c.bucket)
+        )
+        
+        categories = {category: 0 for category in ListingCategory}
+        statuses = {listing_status: 0 for listing_status in ListingStatus}
+        histogram = [0] * len(price_edges)
+        total = 0
+        for category, listing_status, price_bucket, count in result:
+            in_category = filters.category is None or category == filters.category
+            in_status = filters.status is None or listing_status == filters.status
+            if in_status:
+                categories[category] += count
+            if in_category:
+                statuses[listing_status] += count
+            if in_category and in_status:
+                histogram[price_bucket] += count
+                total += count
+        
+        return {
+            "total": total,
+            "categories": categories,
+            "statuses": statuses,
+            "price_histogram": [{
+                "min": edge,
+                "max": price_edges[index + 1] if index + 1 < len(price_edges) else None,
+                "count": histogram[index]
+            } for index, edge in enumerate(price_edges)]
+        }
+    
+    async def get_listing_by_id(self, listing_id: int) -> Optional[Listing]:
+        result = await self.db.execute(select(Listing).filter(Listing.id == listing_id))
+        return result.scalars().first()
     
-    def get_listing_by_id(self, listing_id: int) -> Optional[Listing]:
-        return self.db.query(Listing).filter(Listing.id == listing_id).first()
+    async def get_listings_by_ids(self, listing_ids: List[int], fields: Optional[str] = None) -> List[Listing]:
+        """Listings with these ids in the order asked for; unknown ids are left out"""
+        if not listing_ids:
+            return []
+        result = await self.db.execute(self._select(fields).filter(Listing.id.in_(listing_ids)))
+        listings = {listing.id: listing for listing in (result.all() if fields else result.scalars())}
+        return [listings[listing_id] for listing_id in listing_ids if listing_id in listings]
     
-    def update_listing(self, listing_id: int, listing_update: ListingUpdate, user_email: str) -> Listing:
-        listing = self.get_listing_by_id(listing_id)
+    async def update_listing(self, listing_id: int, listing_update: ListingUpdate, user_email: str) -> Listing:
+        listing = await self.get_listing_by_id(listing_id)
         if not listing:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -73,19 +225,19 @@ class ListingService:
         
         update_data = listing_update.dict(exclude_unset=True)
         
-        # Handle images specially
         if 'images' in update_data:
-            update_data['images'] = json.dumps(update_data['images'])
+            update_data['images'] = update_data['images'] or []
         
         for field, value in update_data.items():
             setattr(listing, field, value)
         
-        self.db.commit()
-        self.db.refresh(listing)
+        await self.db.commit()
+        await self.db.refresh(listing)
+        await response_cache.invalidate_listing(listing_id)
         return listing
     
-    def apply_complex_filters(self, filters: ListingFilters):
-        query = self.db.query(Listing)
+    async def apply_complex_filters(self, filters: ListingFilters, fields: Optional[str] = None):
+        query = self._select(fields)
         
         if filters.category:
             query = query.filter(Listing.category == filters.category)
@@ -94,10 +246,11 @@ class ListingService:
         if filters.max_price:
             query = query.filter(Listing.price <= filters.max_price)
         
-        return query.all()
+        result = await self.db.execute(query)
+        return result.all() if fields else result.scalars().all()
 
-    def delete_listing(self, listing_id: int, user_email: str):
-        listing = self.get_listing_by_id(listing_id)
+    async def delete_listing(self, listing_id: int, user_email: str):
+        listing = await self.get_listing_by_id(listing_id)
         if not listing:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -111,5 +264,6 @@ class ListingService:
                 detail="Not authorized to delete this listing"
             )
         
-        self.db.delete(listing)
-        self.db.commit()
\ No newline at end of file
+        await self.db.delete(listing)
+        await self.db.commit()
+        await response_cache.invalidate_listing(listing_id)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+import httpx
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from config import settings
+from http_clients import clients
+
+logger = logging.getLogger(__name__)
+
+class TokenVerifier:
+    """Verifies auth-service JWTs locally and keeps a synced deny list of revoked tokens"""
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}  # jti -> exp timestamp
+        self._synced_until: Optional[str] = None
+        self._last_sync = 0.0
+        self._sync_lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.jwt_secret)
+
+    async def verify(self, token: str) -> Optional[dict]:
+        """Return user info for the token, or None when auth-service has to be asked"""
+        if not self.enabled:
+            return None
+
+        try:
+            payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        except JWTError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+
+        # Tokens issued before user_id/username were embedded need a lookup
+        if payload.get("sub") is None or payload.get("user_id") is None:
+            return None
+
+        await self.sync_revocations()
+        if payload.get("jti") in self._revoked:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+
+        return {
+            "email": payload["sub"],
+            "user_id": payload["user_id"],
+            "username": payload.get("username")
+        }
+
+    async def sync_revocations(self, force: bool = False):
+        if not force and time.monotonic() - self._last_sync < settings.token_revocation_sync_seconds:
+            return
+
+        async with self._sync_lock:
+            if not force and time.monotonic() - self._last_sync < settings.token_revocation_sync_seconds:
+                return
+
+            params = {"since": self._synced_until} if self._synced_until else {}
+            try:
+                response = await clients.get("auth").get("/v1/auth/revocations", params=params)
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as exc:
+                # Keep serving with the deny list we already have and retry next interval
+                logger.warning("Token revocation sync failed: %s", exc)
+                self._last_sync = time.monotonic()
+                return
+
+            for entry in data["revoked"]:
+                self._revoked[entry["jti"]] = datetime.fromisoformat(entry["expires_at"]).timestamp()
+            self._synced_until = data["until"]
+            self._last_sync = time.monotonic()
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        expired = [jti for jti, exp in self._revoked.items() if exp <= now]
+        for jti in expired:
+            del self._revoked[jti]
+
+token_verifier = TokenVerifier()
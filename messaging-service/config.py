@@ -1,9 +1,72 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     database_url: str
+    # AsyncEngine/AsyncSession by default; false falls back to the sync engine in a threadpool
+    database_async: bool = True
+    # Connection pool per worker (ignored for SQLite)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     auth_service_url: str = "http://localhost:8001"
     listings_service_url: str = "http://localhost:8002"
+    # Listing lookups (seller, title), dropped early on listings-service update/delete events
+    listing_cache_size: int = 10000
+    listing_cache_ttl_seconds: int = 300
+    # When set, /internal/listing-events requires it in X-Listing-Events-Secret
+    listing_events_secret: Optional[str] = None
+    # List endpoints select plain column rows, validate them in bulk and encode with orjson
+    fast_responses: bool = False
+    messages_page_size: int = 50
+    messages_max_page_size: int = 200
+    # Real-time delivery: "memory" fans out within one worker, "redis" shares events between workers
+    pubsub_backend: str = "memory"
+    redis_url: Optional[str] = None
+    ws_max_connections: int = 1000
+    ws_max_connections_per_user: int = 5
+    ws_heartbeat_seconds: float = 25.0
+    # Events buffered per connection before a slow client is disconnected
+    ws_queue_size: int = 100
+    # Shared with auth-service so tokens can be verified locally; unset falls back to /validate
+    jwt_secret: Optional[str] = None
+    jwt_algorithm: str = "HS256"
+    token_revocation_sync_seconds: int = 30
+    # Remote /validate results, bounded by LRU size and never kept past the token's exp or TOKEN_REVOCATION_SYNC_SECONDS
+    token_cache_size: int = 10000
+    token_cache_ttl_seconds: int = 300
+    # Pooled clients for upstream calls; <upstream>_* settings override the http_* defaults
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 2.0
+    http_read_timeout: float = 5.0
+    http_http2: bool = False
+    auth_service_max_connections: Optional[int] = None
+    auth_service_max_keepalive_connections: Optional[int] = None
+    auth_service_connect_timeout: Optional[float] = None
+    auth_service_read_timeout: Optional[float] = None
+    auth_service_http2: Optional[bool] = None
+    listings_service_max_connections: Optional[int] = None
+    listings_service_max_keepalive_connections: Optional[int] = None
+    listings_service_connect_timeout: Optional[float] = None
+    listings_service_read_timeout: Optional[float] = None
+    listings_service_http2: Optional[bool] = None
+    # GET /metrics, per-request query counts, N+1 warnings and the slow-query log; nothing is hooked when off
+    metrics_enabled: bool = False
+    slow_query_ms: float = 200.0
+    n_plus_one_threshold: int = 10
+    # Spans for requests, DB sessions/queries and upstream calls, propagated with W3C traceparent; "memory" or "file"
+    tracing_exporter: str = "off"
+    tracing_file: str = "traces.jsonl"
+    tracing_sample_rate: float = 1.0
+    tracing_service_name: str = "messaging-service"
+    # POST /debug/profile runs a sampling profiler for callers sending this in X-Profiler-Token; no route when unset
+    profiler_token: Optional[str] = None
+    profiler_max_seconds: float = 60.0
+    profiler_max_requests: int = 1000
     
     class Config:
         env_file = ".env"
@@ -1,49 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from schemas import ConversationCreate, ConversationResponse, MessageCreate, MessageResponse
+from schemas import ConversationCreate, ConversationResponse, MessageCreate, MessageResponse, ListingEvent
 from service import MessagingService
 from external_clients import AuthClient, ListingsClient
-from typing import List
+from pubsub import broker, Subscription, SubscriptionClosed, SubscriptionLimitExceeded
+from config import settings
+from pydantic import TypeAdapter
+from typing import List, Optional
+import asyncio
+import hmac
+import orjson
 
 router = APIRouter(prefix="/v1/conversations", tags=["messaging"])
+internal_router = APIRouter(prefix="/internal", include_in_schema=False)
 security = HTTPBearer()
 
+CONVERSATIONS_ADAPTER = TypeAdapter(List[ConversationResponse])
+MESSAGES_ADAPTER = TypeAdapter(List[MessageResponse])
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     user_info = await AuthClient.validate_token(credentials.credentials)
     return user_info
 
+def fast_response(adapter: TypeAdapter, rows) -> Response:
+    """Validate the whole list in one call and encode it with orjson"""
+    validated = adapter.validate_python(rows, from_attributes=True)
+    return Response(
+        content=orjson.dumps(adapter.dump_python(validated), option=orjson.OPT_UTC_Z),
+        media_type="application/json"
+    )
+
 @router.get("/", response_model=List[ConversationResponse])
 async def get_conversations(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     messaging_service = MessagingService(db)
-    conversations = messaging_service.get_user_conversations(current_user["user_id"])
+    if settings.fast_responses:
+        conversations = await messaging_service.get_user_conversations(current_user["user_id"], rows=True)
+        return fast_response(CONVERSATIONS_ADAPTER, conversations)
+    
+    conversations = await messaging_service.get_user_conversations(current_user["user_id"])
     return conversations
 
 @router.post("/", response_model=ConversationResponse)
 async def create_conversation(
     conversation_data: ConversationCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    messaging_service = MessagingService(db)
+    
+    # Repeat "message seller" clicks return the existing conversation without a listings-service call
+    conversation = await messaging_service.get_conversation_for_listing(
+        conversation_data.listing_id, current_user["user_id"]
+    )
+    if conversation:
+        return conversation
+    
     # Get listing information from listings service
     listing_info = await ListingsClient.get_listing(conversation_data.listing_id)
-    
-    messaging_service = MessagingService(db)
-    conversation = messaging_service.create_conversation(conversation_data, current_user, listing_info)
+    conversation = await messaging_service.create_conversation(conversation_data, current_user, listing_info)
     return conversation
 
 @router.get("/{conversation_id}/messages", response_model=List[MessageResponse])
 async def get_conversation_messages(
     conversation_id: int,
+    before_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.messages_max_page_size),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    # Without paging parameters, existing clients keep getting the whole history
+    if limit is None and (before_id is not None or since_id is not None):
+        limit = settings.messages_page_size
+    
     messaging_service = MessagingService(db)
-    messages = messaging_service.get_conversation_messages(conversation_id, current_user["user_id"])
+    messages = await messaging_service.get_conversation_messages(
+        conversation_id, current_user["user_id"], before_id, since_id, limit, rows=settings.fast_responses
+    )
+    if settings.fast_responses:
+        return fast_response(MESSAGES_ADAPTER, messages)
     return messages
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
@@ -51,8 +91,82 @@ async def send_message(
     conversation_id: int,
     message_data: MessageCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     messaging_service = MessagingService(db)
-    message = messaging_service.create_message(conversation_id, message_data, current_user)
+    message = await messaging_service.create_message(conversation_id, message_data, current_user)
     return message
+
+
+@router.websocket("/ws")
+async def conversation_events(websocket: WebSocket):
+    """Pushes {"type": "message", ...} events for the user's conversations, with periodic pings"""
+    # Browsers can't set headers on a WebSocket handshake, so ?token= is accepted too
+    authorization = websocket.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else websocket.query_params.get("token")
+    if not token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    try:
+        current_user = await AuthClient.validate_token(token)
+        subscription = broker.subscribe(f"user:{current_user['user_id']}")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except SubscriptionLimitExceeded:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    
+    await websocket.accept()
+    try:
+        await stream_events(websocket, subscription)
+    finally:
+        subscription.close()
+
+async def stream_events(websocket: WebSocket, subscription: Subscription):
+    async def send_events():
+        while True:
+            event = await subscription.next_event(settings.ws_heartbeat_seconds)
+            # A send that can't complete within a heartbeat means the peer is gone or stalled
+            await asyncio.wait_for(
+                websocket.send_json(event or {"type": "ping"}),
+                settings.ws_heartbeat_seconds
+            )
+    
+    async def receive_until_disconnect():
+        # Client frames (e.g. pongs) are ignored; this only notices the disconnect
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+    
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(receive_until_disconnect())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    if sender in done:
+        error = sender.exception()
+        if isinstance(error, SubscriptionClosed):
+            # Fell behind or the worker is shutting down; reconnect and catch up with since_id
+            code = status.WS_1013_TRY_AGAIN_LATER if error.overflowed else status.WS_1001_GOING_AWAY
+            try:
+                await websocket.close(code=code)
+            except RuntimeError:
+                pass
+        elif error and not isinstance(error, (WebSocketDisconnect, asyncio.TimeoutError)):
+            raise error
+
+@internal_router.post("/listing-events", status_code=status.HTTP_204_NO_CONTENT)
+async def listing_event(event: ListingEvent, x_listing_events_secret: Optional[str] = Header(None)):
+    """Sent by listings-service when a listing changes, so the cached lookup is dropped"""
+    secret = settings.listing_events_secret
+    if secret and not hmac.compare_digest(x_listing_events_secret or "", secret):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid listing events secret"
+        )
+    ListingsClient.invalidate(event.listing_id)
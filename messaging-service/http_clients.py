@@ -0,0 +1,91 @@
+import time
+from typing import Dict
+import httpx
+from config import settings
+from instrumentation import record_upstream_call
+from tracing import client_span
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """Wraps a client's transport so each upstream call is traced and timed, even one that fails without a response"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str):
+        self.transport = transport
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with client_span(self.upstream, request) as span:
+                response = await self.transport.handle_async_request(request)
+                status = str(response.status_code)
+                if span is not None:
+                    span.set("http.status_code", response.status_code)
+                return response
+        finally:
+            record_upstream_call(self.upstream, request.method, status, time.perf_counter() - started)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class HTTPClientRegistry:
+    """Long-lived, pooled httpx clients for upstream services, opened and closed with the app"""
+
+    def __init__(self, upstreams: Dict[str, str]):
+        # name -> settings prefix, e.g. "auth" -> "auth_service"
+        self._upstreams = upstreams
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _setting(self, prefix: str, name: str):
+        override = getattr(settings, f"{prefix}_{name}", None)
+        if override is not None:
+            return override
+        return getattr(settings, f"http_{name}")
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        prefix = self._upstreams[name]
+        # Pool limits and HTTP/2 belong to the transport once the client is given one
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=self._setting(prefix, "max_connections"),
+                max_keepalive_connections=self._setting(prefix, "max_keepalive_connections"),
+                keepalive_expiry=settings.http_keepalive_expiry
+            ),
+            http2=self._setting(prefix, "http2")
+        )
+        return httpx.AsyncClient(
+            base_url=getattr(settings, f"{prefix}_url"),
+            timeout=httpx.Timeout(
+                self._setting(prefix, "read_timeout"),
+                connect=self._setting(prefix, "connect_timeout")
+            ),
+            transport=UpstreamTransport(transport, name)
+        )
+
+    def configured(self, name: str) -> bool:
+        return getattr(settings, f"{self._upstreams[name]}_url") is not None
+
+    def use(self, name: str, client: httpx.AsyncClient):
+        """Install a prebuilt client, e.g. one on an in-process transport; shutdown() closes it"""
+        # httpx has no public way to wrap the transport of a client that already exists
+        client._transport = UpstreamTransport(client._transport, name)
+        self._clients[name] = client
+
+    async def startup(self):
+        for name in self._upstreams:
+            if name not in self._clients and self.configured(name):
+                self._clients[name] = self._build(name)
+
+    async def shutdown(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None:
+            # Used outside the app lifespan (scripts, tests): build on first use
+            client = self._clients[name] = self._build(name)
+        return client
+
+clients = HTTPClientRegistry({"auth": "auth_service", "listings": "listings_service"})
@@ -0,0 +1,234 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from fastapi import FastAPI, Response
+from sqlalchemy import event
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Labels are built from route templates, never raw paths, so cardinality stays bounded
+UNMATCHED_ROUTE = "unmatched"
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count, sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class CounterMetric:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Metrics:
+    """Process-wide metrics in the Prometheus text format; updates take a lock since sync-mode queries run in threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time to serve a request", ("method", "route", "status"), LATENCY_BUCKETS
+        )
+        self.request_queries = Histogram(
+            "db_queries_per_request", "SQL statements executed while serving a request", ("method", "route"),
+            QUERY_COUNT_BUCKETS
+        )
+        self.query_seconds = CounterMetric(
+            "db_query_seconds_total", "Time spent in SQL statements", ("route",)
+        )
+        self.queries = CounterMetric("db_queries_total", "SQL statements executed", ("route",))
+        self.slow_queries = CounterMetric("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS", ("route",))
+        self.n_plus_one = CounterMetric(
+            "db_n_plus_one_total", "Requests that repeated one statement N_PLUS_ONE_THRESHOLD times or more",
+            ("method", "route")
+        )
+        self.upstream_duration = Histogram(
+            "http_client_request_duration_seconds", "Time until an upstream service answered or the call failed",
+            ("upstream", "method", "status"), LATENCY_BUCKETS
+        )
+
+    def observe(self, metric, value: float, *label_values):
+        with self._lock:
+            metric.observe(value, *label_values)
+
+    def inc(self, metric, *label_values, amount: float = 1):
+        with self._lock:
+            metric.inc(*label_values, amount=amount)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (
+                self.request_duration, self.request_queries, self.queries, self.query_seconds,
+                self.slow_queries, self.n_plus_one, self.upstream_duration
+            ):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "query_seconds", "statements")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = Counter()
+
+    @property
+    def route(self) -> str:
+        # FastAPI stores the matched route in the scope while routing
+        return getattr(self.scope.get("route"), "path", UNMATCHED_ROUTE)
+
+# Stats of the request being served; sync-mode threadpool calls copy the context, so they see it too
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def redact(parameters):
+    """Parameter values replaced by their type names, so slow-query logs never carry user data"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [redact(row) for row in parameters[:3]] + ([f"... {len(parameters)} rows"] if len(parameters) > 3 else [])
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    route = stats.route if stats else "-"
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        stats.statements[statement] += 1
+    if elapsed * 1000 >= settings.slow_query_ms:
+        metrics.inc(metrics.slow_queries, route)
+        logger.warning(
+            "slow query (%.1f ms) in %s: %s parameters=%s",
+            elapsed * 1000, route, " ".join(statement.split()), redact(parameters)
+        )
+
+def _handle_error(exception_context):
+    # after_cursor_execute never runs for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+def instrument_engine(engine):
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+class InstrumentationMiddleware:
+    """Times each HTTP request and records the queries it ran under its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            self.record(scope["method"], stats, status_code, elapsed)
+
+    def record(self, method: str, stats: RequestStats, status_code: int, elapsed: float):
+        route = stats.route
+        metrics.observe(metrics.request_duration, elapsed, method, route, str(status_code))
+        metrics.observe(metrics.request_queries, stats.queries, method, route)
+        if stats.queries:
+            metrics.inc(metrics.queries, route, amount=stats.queries)
+            metrics.inc(metrics.query_seconds, route, amount=stats.query_seconds)
+        statement, repeats = stats.statements.most_common(1)[0] if stats.statements else (None, 0)
+        if repeats >= settings.n_plus_one_threshold:
+            metrics.inc(metrics.n_plus_one, method, route)
+            logger.warning(
+                "possible N+1 in %s %s: one statement ran %d times (%d queries total): %s",
+                method, route, repeats, stats.queries, " ".join(statement.split())
+            )
+
+def record_upstream_call(upstream: str, method: str, status: str, elapsed: float):
+    """Times a call to an upstream service under its status code, or "error" when it failed without a response"""
+    if settings.metrics_enabled:
+        metrics.observe(metrics.upstream_duration, elapsed, upstream, method, status)
+
+def instrument(app: FastAPI, engine):
+    """Add the middleware, query hooks and GET /metrics when METRICS_ENABLED; otherwise leave everything untouched"""
+    if not settings.metrics_enabled:
+        return
+    instrument_engine(engine)
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
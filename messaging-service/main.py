@@ -1,13 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from controller import router
-from database import Base, engine
+from instrumentation import instrument
+from tracing import install_tracing
+from profiling import install_profiler
+from controller import router, internal_router
+from http_clients import clients
+from database import engine, init_db, pool_status
+from external_clients import AuthClient, ListingsClient
+from pubsub import broker
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await clients.startup()
+    await broker.start()
+    yield
+    await broker.stop()
+    await clients.shutdown()
 
-app = FastAPI(title="NCSU Marketplace - Messaging Service", version="1.0.0")
+app = FastAPI(title="NCSU Marketplace - Messaging Service", version="1.0.0", lifespan=lifespan)
 
 app.include_router(router)
+app.include_router(internal_router)
+instrument(app, engine)
+install_profiler(app)
 
 @app.get("/")
 async def root():
@@ -15,4 +31,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/db")
+async def database_pool_status():
+    return pool_status()
+
+@app.get("/health/cache")
+async def cache_stats():
+    return {"token_cache": AuthClient.cache_stats(), "listing_cache": ListingsClient.cache_stats()}
+
+@app.get("/health/pubsub")
+async def pubsub_stats():
+    return broker.stats()
+
+install_tracing(app, engine)
@@ -0,0 +1,50 @@
+"""initial schema: conversations and messages
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Databases created by the old create_all() startup already have these tables
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "conversations" not in existing:
+        op.create_table(
+            "conversations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("listing_id", sa.Integer(), nullable=False),
+            sa.Column("buyer_id", sa.Integer(), nullable=False),
+            sa.Column("buyer_email", sa.String(), nullable=False),
+            sa.Column("seller_id", sa.Integer(), nullable=False),
+            sa.Column("seller_email", sa.String(), nullable=False),
+            sa.Column("listing_title", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_conversations_id", "conversations", ["id"])
+
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id"), nullable=False),
+            sa.Column("sender_id", sa.Integer(), nullable=False),
+            sa.Column("sender_email", sa.String(), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("is_read", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_messages_id", "messages", ["id"])
+
+def downgrade():
+    op.drop_table("messages")
+    op.drop_table("conversations")
@@ -0,0 +1,37 @@
+"""composite indexes for inbox, conversation lookup and unread counts
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Inbox: buyer_id = :user OR seller_id = :user ORDER BY updated_at DESC
+    op.create_index("ix_conversations_buyer_id_updated_at", "conversations", ["buyer_id", "updated_at"])
+    op.create_index("ix_conversations_seller_id_updated_at", "conversations", ["seller_id", "updated_at"])
+    # Existing-conversation check in create_conversation
+    op.create_index("ix_conversations_listing_id_buyer_id", "conversations", ["listing_id", "buyer_id"])
+    # History and last message per conversation
+    op.create_index("ix_messages_conversation_id_created_at", "messages", ["conversation_id", "created_at"])
+    # Unread counts and read-marking only ever look at unread rows
+    op.create_index(
+        "ix_messages_unread",
+        "messages",
+        ["conversation_id", "sender_id"],
+        postgresql_where=sa.text("is_read = false"),
+        sqlite_where=sa.text("is_read = 0")
+    )
+
+def downgrade():
+    op.drop_index("ix_messages_unread", table_name="messages")
+    op.drop_index("ix_messages_conversation_id_created_at", table_name="messages")
+    op.drop_index("ix_conversations_listing_id_buyer_id", table_name="conversations")
+    op.drop_index("ix_conversations_seller_id_updated_at", table_name="conversations")
+    op.drop_index("ix_conversations_buyer_id_updated_at", table_name="conversations")
@@ -0,0 +1,52 @@
+"""denormalized conversation counters: last message, message count, unread per participant
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# 0005 reruns this for the conversations it merges, appending a WHERE clause
+BACKFILL = """
+UPDATE conversations SET
+    message_count = (
+        SELECT count(*) FROM messages WHERE messages.conversation_id = conversations.id
+    ),
+    last_message_id = (
+        SELECT messages.id FROM messages WHERE messages.conversation_id = conversations.id
+        ORDER BY messages.created_at DESC, messages.id DESC LIMIT 1
+    ),
+    buyer_unread = (
+        SELECT count(*) FROM messages WHERE messages.conversation_id = conversations.id
+        AND messages.sender_id != conversations.buyer_id AND messages.is_read = false
+    ),
+    seller_unread = (
+        SELECT count(*) FROM messages WHERE messages.conversation_id = conversations.id
+        AND messages.sender_id != conversations.seller_id AND messages.is_read = false
+    )
+"""
+
+def upgrade():
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.add_column(sa.Column("last_message_id", sa.Integer()))
+        batch_op.add_column(sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("buyer_unread", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("seller_unread", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.create_foreign_key(
+            "fk_conversations_last_message_id", "messages", ["last_message_id"], ["id"], ondelete="SET NULL"
+        )
+    op.execute(BACKFILL)
+
+def downgrade():
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.drop_constraint("fk_conversations_last_message_id", type_="foreignkey")
+        batch_op.drop_column("seller_unread")
+        batch_op.drop_column("buyer_unread")
+        batch_op.drop_column("message_count")
+        batch_op.drop_column("last_message_id")
@@ -0,0 +1,19 @@
+"""index for id-based message history and polling
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # before_id / since_id pages: conversation_id = :id AND id < / > :cursor ORDER BY id
+    op.create_index("ix_messages_conversation_id_id", "messages", ["conversation_id", "id"])
+
+def downgrade():
+    op.drop_index("ix_messages_conversation_id_id", table_name="messages")
@@ -0,0 +1,47 @@
+"""one conversation per (listing_id, buyer_id)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def recount_sql() -> str:
+    """0003's counter backfill, limited to one conversation"""
+    backfill = context.script.get_revision("0003").module.BACKFILL
+    return backfill + "WHERE conversations.id = :keep_id\n"
+
+def merge_duplicates(bind):
+    """Fold duplicate conversations created by racing requests into the oldest one"""
+    duplicates = bind.execute(sa.text(
+        "SELECT listing_id, buyer_id, min(id) FROM conversations "
+        "GROUP BY listing_id, buyer_id HAVING count(*) > 1"
+    )).all()
+    recount = sa.text(recount_sql())
+    for listing_id, buyer_id, keep_id in duplicates:
+        params = {"listing_id": listing_id, "buyer_id": buyer_id, "keep_id": keep_id}
+        bind.execute(sa.text(
+            "UPDATE messages SET conversation_id = :keep_id WHERE conversation_id IN ("
+            "SELECT id FROM conversations "
+            "WHERE listing_id = :listing_id AND buyer_id = :buyer_id AND id != :keep_id)"
+        ), params)
+        bind.execute(sa.text(
+            "DELETE FROM conversations "
+            "WHERE listing_id = :listing_id AND buyer_id = :buyer_id AND id != :keep_id"
+        ), params)
+        bind.execute(recount, params)
+
+def upgrade():
+    merge_duplicates(op.get_bind())
+    op.drop_index("ix_conversations_listing_id_buyer_id", table_name="conversations")
+    op.create_index("uq_conversations_listing_id_buyer_id", "conversations", ["listing_id", "buyer_id"], unique=True)
+
+def downgrade():
+    op.drop_index("uq_conversations_listing_id_buyer_id", table_name="conversations")
+    op.create_index("ix_conversations_listing_id_buyer_id", "conversations", ["listing_id", "buyer_id"])
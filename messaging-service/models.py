@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    # Indexes are created by migrations/versions; declared here so metadata matches the schema
+    __table_args__ = (
+        Index("ix_conversations_buyer_id_updated_at", "buyer_id", "updated_at"),
+        Index("ix_conversations_seller_id_updated_at", "seller_id", "updated_at"),
+        # One conversation per buyer and listing, so concurrent creates can't duplicate it
+        Index("uq_conversations_listing_id_buyer_id", "listing_id", "buyer_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     listing_id = Column(Integer, nullable=False)
@@ -16,11 +23,35 @@ class Conversation(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Maintained by MessagingService and rebuilt by reconcile_counters.py
+    last_message_id = Column(
+        Integer,
+        ForeignKey("messages.id", use_alter=True, name="fk_conversations_last_message_id", ondelete="SET NULL")
+    )
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    buyer_unread = Column(Integer, nullable=False, default=0, server_default="0")
+    seller_unread = Column(Integer, nullable=False, default=0, server_default="0")
     
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship(
+        "Message", back_populates="conversation", cascade="all, delete-orphan",
+        foreign_keys="Message.conversation_id"
+    )
+    last_message = relationship("Message", foreign_keys=[last_message_id], lazy="joined", post_update=True)
+    
+    def unread_count_for(self, user_id: int) -> int:
+        return self.buyer_unread if user_id == self.buyer_id else self.seller_unread
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+        Index(
+            "ix_messages_unread", "conversation_id", "sender_id",
+            postgresql_where=text("is_read = false"),
+            sqlite_where=text("is_read = 0")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
@@ -30,4 +61,4 @@ class Message(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages", foreign_keys=[conversation_id])
\ No newline at end of file
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Set
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_CLOSED = object()
+
+class SubscriptionLimitExceeded(Exception):
+    pass
+
+class SubscriptionClosed(Exception):
+    def __init__(self, overflowed: bool):
+        super().__init__("subscriber fell behind" if overflowed else "subscription closed")
+        self.overflowed = overflowed
+
+class Subscription:
+    """One connection's bounded event queue; a subscriber that falls behind is closed, not buffered"""
+
+    def __init__(self, broker: "Broker", channel: str, queue_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def deliver(self, event: dict):
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Messages are persisted, so the client reconnects and catches up with since_id
+            self.overflowed = True
+            self.close()
+
+    async def next_event(self, timeout: float) -> Optional[dict]:
+        """Next event, or None if nothing arrived within timeout; raises SubscriptionClosed once closed"""
+        try:
+            event = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is _CLOSED:
+            raise SubscriptionClosed(self.overflowed)
+        return event
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.broker._remove(self)
+        # Drop whatever is pending and wake up the reader
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(_CLOSED)
+
+class Broker:
+    """Fans events out to this worker's subscribers; subclasses decide how publishes reach every worker"""
+
+    def __init__(self, max_subscriptions: int, max_per_channel: int, queue_size: int):
+        self.max_subscriptions = max_subscriptions
+        self.max_per_channel = max_per_channel
+        self.queue_size = queue_size
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._overflows = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        for subscriptions in list(self._channels.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+
+    async def publish(self, channel: str, event: dict):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscriptions = self._channels.setdefault(channel, set())
+        if self._count >= self.max_subscriptions or len(subscriptions) >= self.max_per_channel:
+            if not subscriptions:
+                del self._channels[channel]
+            raise SubscriptionLimitExceeded(channel)
+
+        subscription = Subscription(self, channel, self.queue_size)
+        subscriptions.add(subscription)
+        self._count += 1
+        return subscription
+
+    def deliver(self, channel: str, event: dict):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription.deliver(event)
+
+    def _remove(self, subscription: Subscription):
+        subscriptions = self._channels.get(subscription.channel)
+        if not subscriptions or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._channels[subscription.channel]
+        self._count -= 1
+        if subscription.overflowed:
+            self._overflows += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "subscriptions": self._count,
+            "channels": len(self._channels),
+            "overflows": self._overflows
+        }
+
+class InMemoryBroker(Broker):
+    """Single-worker broker; also the stand-in for tests"""
+
+    async def publish(self, channel: str, event: dict):
+        self.deliver(channel, event)
+
+class RedisBroker(Broker):
+    """Shares publishes between workers through Redis pub/sub; each worker fans out locally"""
+
+    def __init__(self, url: str, prefix: str = "messaging:", **limits):
+        super().__init__(**limits)
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("PUBSUB_BACKEND=redis needs the redis package (pip install redis)")
+
+        self._redis = redis.from_url(self.url)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._redis:
+            await self._redis.close()
+        await super().stop()
+
+    async def publish(self, channel: str, event: dict):
+        await self._redis.publish(self.prefix + channel, json.dumps(event))
+
+    async def _listen(self):
+        # One pattern subscription per worker, re-established if the connection drops
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.prefix}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"].decode()[len(self.prefix):]
+                    self.deliver(channel, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis pub/sub listener failed, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+def create_broker() -> Broker:
+    limits = {
+        "max_subscriptions": settings.ws_max_connections,
+        "max_per_channel": settings.ws_max_connections_per_user,
+        "queue_size": settings.ws_queue_size
+    }
+    if settings.pubsub_backend == "redis":
+        return RedisBroker(settings.redis_url, **limits)
+    return InMemoryBroker(**limits)
+
+broker = create_broker()
@@ -0,0 +1,26 @@
+"""Rebuild conversation counters (last message, message count, unread) from the messages table.
+
+    python reconcile_counters.py            # every conversation
+    python reconcile_counters.py 12 40      # only these conversation ids
+"""
+import argparse
+import asyncio
+from database import get_db, engine
+from service import MessagingService
+
+async def reconcile(conversation_ids):
+    async for db in get_db():
+        updated = await MessagingService(db).reconcile_counters(conversation_ids)
+    await engine.dispose()
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("conversation_ids", type=int, nargs="*")
+    args = parser.parse_args()
+
+    updated = asyncio.run(reconcile(args.conversation_ids or None))
+    print(f"reconciled {updated} conversations")
+
+if __name__ == "__main__":
+    main()
@@ -32,7 +32,12 @@ class ConversationResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
     last_message: Optional[MessageResponse] = None
+    message_count: int = 0
     unread_count: int = 0
     
     class Config:
         from_attributes = True
+
+class ListingEvent(BaseModel):
+    type: str
+    listing_id: int
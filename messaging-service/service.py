@@ -1,29 +1,37 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc
+from sqlalchemy import select, update, func, or_, and_, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Conversation, Message
-from schemas import ConversationCreate, MessageCreate
+from schemas import ConversationCreate, MessageCreate, MessageResponse
 from fastapi import HTTPException, status
+from pubsub import broker
 from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def as_dicts(keys, rows) -> List[dict]:
+    # Pydantic validates plain dicts much faster than Row objects read through from_attributes
+    keys = tuple(keys)
+    return [dict(zip(keys, row)) for row in rows]
 
 class MessagingService:
     CONVERSATION_NOT_FOUND = "conversation not found "
     ACCESS_DENIED = "access denied"
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def create_conversation(self, conversation_data: ConversationCreate, buyer_info: dict, listing_info: dict) -> Conversation:
-        # Check if conversation already exists
-        existing_conversation = self.db.query(Conversation).filter(
+    async def get_conversation_for_listing(self, listing_id: int, buyer_id: int) -> Optional[Conversation]:
+        result = await self.db.execute(select(Conversation).filter(
             and_(
-                Conversation.listing_id == conversation_data.listing_id,
-                Conversation.buyer_id == buyer_info["user_id"]
+                Conversation.listing_id == listing_id,
+                Conversation.buyer_id == buyer_id
             )
-        ).first()
-        
-        if existing_conversation:
-            return existing_conversation
-        
+        ))
+        return result.scalars().first()
+    
+    async def create_conversation(self, conversation_data: ConversationCreate, buyer_info: dict, listing_info: dict) -> Conversation:
         # Prevent seller from creating conversation with themselves
         if listing_info["seller_id"] == buyer_info["user_id"]:
             raise HTTPException(
@@ -41,41 +49,60 @@ class MessagingService:
         )
         
         self.db.add(db_conversation)
-        self.db.commit()
-        self.db.refresh(db_conversation)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # A concurrent request created it first; (listing_id, buyer_id) is unique
+            await self.db.rollback()
+            existing_conversation = await self.get_conversation_for_listing(
+                conversation_data.listing_id, buyer_info["user_id"]
+            )
+            if existing_conversation is None:
+                raise
+            return existing_conversation
+        await self.db.refresh(db_conversation)
         return db_conversation
     
-    def get_user_conversations(self, user_id: int) -> List[Conversation]:
-        conversations = self.db.query(Conversation).filter(
-            or_(
-                Conversation.buyer_id == user_id,
-                Conversation.seller_id == user_id
-            )
-        ).order_by(desc(Conversation.updated_at)).all()
+    async def get_user_conversations(self, user_id: int, rows: bool = False) -> List[Conversation]:
+        """The user's inbox; with rows=True, plain dicts built from one outer join instead of ORM instances"""
+        participant = or_(
+            Conversation.buyer_id == user_id,
+            Conversation.seller_id == user_id
+        )
+        if rows:
+            return await self._conversation_rows(participant, user_id)
         
-        # Add last message and unread count to each conversation
+        result = await self.db.execute(select(Conversation).filter(participant).order_by(desc(Conversation.updated_at)))
+        conversations = result.scalars().all()
+        
+        # last_message is joined in and unread counts are kept on the row
         for conversation in conversations:
-            last_message = self.db.query(Message).filter(
-                Message.conversation_id == conversation.id
-            ).order_by(desc(Message.created_at)).first()
-            
-            conversation.last_message = last_message
-            
-            # Count unread messages for the current user
-            unread_count = self.db.query(Message).filter(
-                and_(
-                    Message.conversation_id == conversation.id,
-                    Message.sender_id != user_id,
-                    Message.is_read == False
-                )
-            ).count()
-            
-            conversation.unread_count = unread_count
+            conversation.unread_count = conversation.unread_count_for(user_id)
         
         return conversations
     
-    def get_conversation_by_id(self, conversation_id: int, user_id: int) -> Optional[Conversation]:
-        conversation = self.db.query(Conversation).filter(
+    async def _conversation_rows(self, participant, user_id: int) -> List[dict]:
+        conversation_columns = Conversation.__table__.columns
+        message_columns = Message.__table__.columns
+        query = select(
+            *conversation_columns,
+            *(column.label(f"last_{column.name}") for column in message_columns)
+        ).select_from(
+            Conversation.__table__.outerjoin(Message.__table__, Message.id == Conversation.last_message_id)
+        ).filter(participant).order_by(desc(Conversation.updated_at))
+        result = await self.db.execute(query)
+        
+        conversations = []
+        for row in as_dicts(result.keys(), result):
+            conversation = {column.name: row[column.name] for column in conversation_columns}
+            if row["last_message_id"] is not None:
+                conversation["last_message"] = {column.name: row[f"last_{column.name}"] for column in message_columns}
+            conversation["unread_count"] = row["buyer_unread"] if user_id == row["buyer_id"] else row["seller_unread"]
+            conversations.append(conversation)
+        return conversations
+    
+    async def get_conversation_by_id(self, conversation_id: int, user_id: int) -> Optional[Conversation]:
+        result = await self.db.execute(select(Conversation).filter(
             and_(
                 Conversation.id == conversation_id,
                 or_(
@@ -83,39 +110,86 @@ class MessagingService:
                     Conversation.seller_id == user_id
                 )
             )
-        ).first()
+        ))
+        conversation = result.scalars().first()
         
         return conversation
     
-    def get_conversation_messages(self, conversation_id: int, user_id: int) -> List[Message]:
-        conversation = self.get_conversation_by_id(conversation_id, user_id)
+    async def get_conversation_messages(
+        self,
+        conversation_id: int,
+        user_id: int,
+        before_id: Optional[int] = None,
+        since_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        rows: bool = False
+    ) -> List[Message]:
+        conversation = await self.get_conversation_by_id(conversation_id, user_id)
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=self.CONVERSATION_NOT_FOUND
             )
+        if before_id is not None and since_id is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="before_id and since_id cannot be combined"
+            )
         
-        messages = self.db.query(Message).filter(
-            Message.conversation_id == conversation_id
-        ).order_by(Message.created_at.asc()).all()
+        # Plain column rows skip ORM hydration and identity-map tracking; returned as dicts
+        query = select(*Message.__table__.columns) if rows else select(Message)
+        query = query.filter(Message.conversation_id == conversation_id)
+        newest_first = since_id is None and (before_id is not None or limit is not None)
+        if since_id is not None:
+            # Polling: the messages that arrived after since_id, oldest first
+            query = query.filter(Message.id > since_id).order_by(Message.id.asc())
+        elif newest_first:
+            # History: the latest page before before_id
+            if before_id is not None:
+                query = query.filter(Message.id < before_id)
+            query = query.order_by(Message.id.desc())
+        else:
+            query = query.order_by(Message.created_at.asc())
+        if limit is not None:
+            query = query.limit(limit)
         
-        # Mark messages as read for the current user
-        self.db.query(Message).filter(
-            and_(
-                Message.conversation_id == conversation_id,
-                Message.sender_id != user_id,
-                Message.is_read == False
-            )
-        ).update({"is_read": True})
+        result = await self.db.execute(query)
+        columns = result.keys()
+        messages = result.all() if rows else result.scalars().all()
+        if newest_first:
+            messages = messages[::-1]
+        
+        # Mark only the returned messages as read for the current user
+        unread_ids = [message.id for message in messages if message.sender_id != user_id and not message.is_read]
+        if unread_ids:
+            marked = await self.db.execute(update(Message).where(
+                and_(
+                    Message.id.in_(unread_ids),
+                    Message.is_read == False
+                )
+            ).values(is_read=True))
+            
+            # Subtract what was marked so messages arriving meanwhile stay counted
+            if marked.rowcount:
+                if user_id == conversation.buyer_id:
+                    conversation.buyer_unread = Conversation.buyer_unread - marked.rowcount
+                else:
+                    conversation.seller_unread = Conversation.seller_unread - marked.rowcount
+            
+            await self.db.commit()
         
-        self.db.commit()
+        if rows:
+            # ORM instances were updated in place by the UPDATE; report the dicts the same way
+            messages = as_dicts(columns, messages)
+            unread_ids = set(unread_ids)
+            for message in messages:
+                if message["id"] in unread_ids:
+                    message["is_read"] = True
         return messages
     
-    def get_conversation_summary(self, conversation_id: int, user_id: int):
+    async def get_conversation_summary(self, conversation_id: int, user_id: int):
         # """Intentionally duplicating string literals"""
-        conversation = self.db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
+        conversation = await self.db.get(Conversation, conversation_id)
         
         if not conversation:
             raise HTTPException(
@@ -129,11 +203,7 @@ class MessagingService:
                 detail=self.ACCESS_DENIED  # Duplicated string
             )
         
-        messages = self.db.query(Message).filter(
-            Message.conversation_id == conversation_id
-        ).all()
-        
-        if not messages:
+        if not conversation.message_count:
             raise HTTPException(
                 status_code=404,
                 detail=self.CONVERSATION_NOT_FOUND  # Duplicated string (same as above)
@@ -141,15 +211,13 @@ class MessagingService:
         
         return {
             "conversation_id": conversation_id,
-            "message_count": len(messages),
+            "message_count": conversation.message_count,
             "status": "active" if conversation.is_active else "inactive"
         }
 
-    def delete_conversation(self, conversation_id: int, user_id: int):
+    async def delete_conversation(self, conversation_id: int, user_id: int):
         """More duplicated strings"""
-        conversation = self.db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
+        conversation = await self.db.get(Conversation, conversation_id)
         
         if not conversation:
             raise HTTPException(
@@ -163,15 +231,15 @@ class MessagingService:
                 detail=self.ACCESS_DENIED  # Duplicated again
             )
         
-        self.db.delete(conversation)
-        self.db.commit()
+        await self.db.delete(conversation)
+        await self.db.commit()
 
-    def create_message(self, conversation_id: int, message_data: MessageCreate, sender_info: dict) -> Message:
-        conversation = self.get_conversation_by_id(conversation_id, sender_info["user_id"])
+    async def create_message(self, conversation_id: int, message_data: MessageCreate, sender_info: dict) -> Message:
+        conversation = await self.get_conversation_by_id(conversation_id, sender_info["user_id"])
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=CONVERSATION_NOT_FOUND
+                detail=self.CONVERSATION_NOT_FOUND
             )
         
         db_message = Message(
@@ -183,9 +251,49 @@ class MessagingService:
         
         self.db.add(db_message)
         
-        # Update conversation timestamp
-        conversation.updated_at = db_message.created_at
+        # Counters are incremented in SQL so concurrent senders don't overwrite each other
+        conversation.last_message = db_message
+        conversation.message_count = Conversation.message_count + 1
+        if sender_info["user_id"] == conversation.buyer_id:
+            conversation.seller_unread = Conversation.seller_unread + 1
+        else:
+            conversation.buyer_unread = Conversation.buyer_unread + 1
+        # Update conversation timestamp (created_at is a server default, unset until flush)
+        conversation.updated_at = func.now()
+        
+        await self.db.commit()
+        await self.db.refresh(db_message)
+        await self.publish_message(conversation, db_message)
+        return db_message
+    
+    async def publish_message(self, conversation: Conversation, message: Message):
+        """Push a new message to both participants' live connections"""
+        event = {"type": "message", "message": MessageResponse.model_validate(message).model_dump(mode="json")}
+        try:
+            for user_id in (conversation.buyer_id, conversation.seller_id):
+                await broker.publish(f"user:{user_id}", event)
+        except Exception:
+            # The message is stored either way; clients catch up with since_id
+            logger.exception("Failed to publish message %s", message.id)
+    
+    async def reconcile_counters(self, conversation_ids: Optional[List[int]] = None) -> int:
+        """Rebuild the denormalized conversation counters from the messages table."""
+        def count_messages(*criteria):
+            return select(func.count()).select_from(Message).where(
+                Message.conversation_id == Conversation.id, *criteria
+            ).scalar_subquery()
+        
+        statement = update(Conversation).values(
+            message_count=count_messages(),
+            last_message_id=select(Message.id).where(
+                Message.conversation_id == Conversation.id
+            ).order_by(Message.created_at.desc(), Message.id.desc()).limit(1).scalar_subquery(),
+            buyer_unread=count_messages(Message.sender_id != Conversation.buyer_id, Message.is_read == False),
+            seller_unread=count_messages(Message.sender_id != Conversation.seller_id, Message.is_read == False)
+        ).execution_options(synchronize_session=False)
+        if conversation_ids is not None:
+            statement = statement.where(Conversation.id.in_(conversation_ids))
         
-        self.db.commit()
-        self.db.refresh(db_message)
-        return db_message
\ No newline at end of file
+        result = await self.db.execute(statement)
+        await self.db.commit()
+        return result.rowcount
@@ -1,6 +1,7 @@
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URLS = {
     'auth': 'http://localhost:8001',
@@ -67,6 +68,74 @@ def test_listings_service(token):
     
     return None
 
+def test_listings_pagination(token):
+    print("\nTesting Listings Pagination...")
+    
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # Seed enough listings to span several pages
+    for i in range(12):
+        listing_data = {
+            "title": f"Pagination Item {i}",
+            "price": 10.00 + i,
+            "category": "other"
+        }
+        requests.post(f"{BASE_URLS['listings']}/v1/listings/", json=listing_data, headers=headers)
+    
+    seen_ids = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{BASE_URLS['listings']}/v1/listings/", params=params)
+        if response.status_code != 200:
+            print(f"Get Listings Page: {response.status_code} - {response.json()}")
+            return
+        page = response.json()
+        seen_ids.extend(item['id'] for item in page['items'])
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    
+    # Walking the cursor must yield exactly the unpaginated (legacy) result, in order
+    response = requests.get(f"{BASE_URLS['listings']}/v1/listings/")
+    all_ids = [item['id'] for item in response.json()]
+    result = "OK" if seen_ids == all_ids else "MISMATCH"
+    print(f"Paginated Listings: {len(seen_ids)} listings over {pages} pages, {len(all_ids)} unpaginated - {result}")
+
+def test_listings_projection():
+    print("\nTesting Listings Projection...")
+    
+    detail = requests.get(f"{BASE_URLS['listings']}/v1/listings/").json()
+    response = requests.get(f"{BASE_URLS['listings']}/v1/listings/", params={"fields": "summary"})
+    summary = response.json()
+    
+    # Same listings in the same order, without the heavy fields
+    same_ids = [item['id'] for item in summary] == [item['id'] for item in detail]
+    trimmed = all('description' not in item and 'seller_email' not in item for item in summary)
+    result = "OK" if response.status_code == 200 and same_ids and trimmed else "MISMATCH"
+    print(f"Summary Listings: {response.status_code} - {len(summary)} listings - {result}")
+
+def test_listings_facets():
+    print("\nTesting Listings Facets...")
+    
+    response = requests.get(f"{BASE_URLS['listings']}/v1/listings/facets")
+    facets = response.json()
+    listings = requests.get(f"{BASE_URLS['listings']}/v1/listings/").json()
+    
+    # Every facet must add up to the listings the same filters return
+    totals = {
+        facets['total'],
+        sum(facets['categories'].values()),
+        sum(bucket['count'] for bucket in facets['price_histogram']),
+        len(listings)
+    }
+    result = "OK" if response.status_code == 200 and len(totals) == 1 else "MISMATCH"
+    print(f"Listing Facets: {response.status_code} - {facets['total']} listings - {result}")
+
 def test_messaging_service(token, listing_id):
     print("\nTesting Messaging Service...")
     
@@ -85,6 +154,40 @@ def test_messaging_service(token, listing_id):
     response = requests.get(f"{BASE_URLS['messaging']}/v1/conversations/", headers=headers)
     print(f"Get Conversations: {response.status_code}")
 
+def test_conversation_concurrency(listing_id):
+    print("\nTesting Concurrent Conversation Creation...")
+    
+    # A second user, since sellers can't message their own listing
+    user_data = {
+        "email": "buyer@ncsu.edu",
+        "username": "testbuyer",
+        "password": "testpass123",
+        "full_name": "Test Buyer"
+    }
+    requests.post(f"{BASE_URLS['auth']}/v1/auth/register", json=user_data)
+    response = requests.post(f"{BASE_URLS['auth']}/v1/auth/login",
+                             json={"email": user_data["email"], "password": user_data["password"]})
+    if response.status_code != 200:
+        print(f"Buyer Login: {response.status_code} - {response.json()}")
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    # Simulate repeated "message seller" clicks arriving at the same time
+    def create_conversation(_):
+        return requests.post(f"{BASE_URLS['messaging']}/v1/conversations/",
+                             json={"listing_id": listing_id}, headers=headers)
+    
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(pool.map(create_conversation, range(10)))
+    
+    statuses = sorted({response.status_code for response in responses})
+    conversation_ids = {response.json()["id"] for response in responses if response.status_code == 200}
+    
+    response = requests.get(f"{BASE_URLS['messaging']}/v1/conversations/", headers=headers)
+    rows = [c for c in response.json() if c["listing_id"] == listing_id]
+    result = "OK" if statuses == [200] and len(conversation_ids) == 1 and len(rows) == 1 else "DUPLICATED"
+    print(f"Parallel Create Conversation: statuses {statuses}, {len(conversation_ids)} distinct ids, {len(rows)} rows - {result}")
+
 def main():
     print("Starting API Tests...")
     time.sleep(2)  # Wait for services to be ready
@@ -92,8 +195,12 @@ def main():
     token = test_auth_service()
     if token:
         listing_id = test_listings_service(token)
+        test_listings_pagination(token)
+        test_listings_projection()
+        test_listings_facets()
         if listing_id:
             test_messaging_service(token, listing_id)
+            test_conversation_concurrency(listing_id)
     
     print("\nTests completed!")
 
@@ -0,0 +1,127 @@
+"""Facet checks for GET /v1/listings/facets: counts, FAST_RESPONSES and FACETS_PRICE_EDGES.
+
+Runs listings-service in-process against a seeded SQLite database, once with
+FAST_RESPONSES=true and once without, and compares every facet with counts
+worked out here from the seeded rows.
+
+    python3 test_facets.py
+    python3 -m pytest test_facets.py
+"""
+import asyncio
+import os
+import sys
+import httpx
+from pydantic import ValidationError
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import service_env
+from service_loader import load_service
+
+PRICE_EDGES = [0, 10, 50, 100]
+CATEGORIES = ["textbooks", "electronics", "furniture", "clothing", "sports", "other"]
+STATUSES = ["available", "sold", "pending"]
+ROWS = [{
+    "category": CATEGORIES[i % len(CATEGORIES)],
+    "status": STATUSES[(i // len(CATEGORIES)) % len(STATUSES)],
+    "price": (i * 7) % 150 + 0.5,
+} for i in range(300)]
+
+QUERIES = [
+    {},
+    {"category": "furniture"},
+    {"status": "sold"},
+    {"category": "textbooks", "status": "pending"},
+    {"min_price": 20, "max_price": 90},
+    {"category": "electronics", "min_price": 60},
+]
+
+def expected_facets(params: dict) -> dict:
+    """What the endpoint should return, with each facet ignoring only its own filter"""
+    category, status = params.get("category"), params.get("status", "available")
+    low, high = params.get("min_price", 0), params.get("max_price", float("inf"))
+    rows = [row for row in ROWS if low <= row["price"] <= high]
+    in_category = [row for row in rows if category is None or row["category"] == category]
+    in_status = [row for row in rows if row["status"] == status]
+    both = [row for row in in_category if row["status"] == status]
+
+    def bucket(price: float) -> int:
+        return max(index for index, edge in enumerate(PRICE_EDGES) if price >= edge)
+
+    return {
+        "total": len(both),
+        "categories": {value: sum(row["category"] == value for row in in_status) for value in CATEGORIES},
+        "statuses": {value: sum(row["status"] == value for row in in_category) for value in STATUSES},
+        "price_histogram": [{
+            "min": edge,
+            "max": PRICE_EDGES[index + 1] if index + 1 < len(PRICE_EDGES) else None,
+            "count": sum(bucket(row["price"]) == index for row in both),
+        } for index, edge in enumerate(PRICE_EDGES)],
+    }
+
+async def facets_responses(fast: bool) -> list:
+    listings = load_service("listings-service", {
+        **service_env("listings"),
+        "RESPONSE_CACHE_BACKEND": "off",
+        "FAST_RESPONSES": "true" if fast else "false",
+        "FACETS_PRICE_EDGES": str(PRICE_EDGES),
+    })
+    models = listings.models
+    app = listings.main.app
+
+    def seed(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"listing {i}",
+            "price": row["price"],
+            "category": models.ListingCategory(row["category"]),
+            "status": models.ListingStatus(row["status"]),
+            "seller_email": "seller@ncsu.edu",
+            "seller_id": 1,
+            "images": [],
+        } for i, row in enumerate(ROWS)])
+
+    responses = []
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            for params in QUERIES:
+                response = await client.get("/v1/listings/facets", params=params)
+                assert response.status_code == 200, f"{params} (fast={fast}): {response.status_code} {response.text}"
+                assert response.json() == expected_facets(params), f"{params} (fast={fast}): {response.json()}"
+                responses.append(response.json())
+
+    await listings.database.engine.dispose()
+    return responses
+
+async def check_facets():
+    assert await facets_responses(fast=True) == await facets_responses(fast=False)
+
+def test_facets_in_both_response_modes():
+    asyncio.run(check_facets())
+
+def test_price_edges_are_validated():
+    for edges in ("[10]", "[]", "[0, 50, 25]", "[0, 0, 10]"):
+        try:
+            load_service("listings-service", {**service_env("listings"), "FACETS_PRICE_EDGES": edges}, modules=("config",))
+        except ValidationError:
+            continue
+        raise AssertionError(f"FACETS_PRICE_EDGES={edges} was accepted")
+    settings = load_service(
+        "listings-service", {**service_env("listings"), "FACETS_PRICE_EDGES": "[5, 20]"}, modules=("config",)
+    ).config.settings
+    assert settings.facets_price_edges == [5, 20]
+
+def main():
+    failed = False
+    for check in (test_facets_in_both_response_modes, test_price_edges_are_validated):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
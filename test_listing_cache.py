@@ -0,0 +1,155 @@
+"""Listing lookup checks: messaging-service's cached ListingsClient and listings-service's ?ids= batch lookup.
+
+Messaging talks to stand-ins for auth and listings-service on an
+httpx.MockTransport that counts the listing fetches; listings-service runs
+against a small seeded SQLite database.
+
+    python3 test_listing_cache.py
+    python3 -m pytest test_listing_cache.py
+"""
+import asyncio
+import os
+import sys
+from collections import Counter
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import bearer, service_env, stub_client
+from service_loader import load_service
+
+EVENTS_SECRET = "listing-events-check"
+LISTING = {"id": 7, "seller_id": 1, "seller_email": "seller@ncsu.edu", "title": "Standing desk"}
+
+async def check_listing_cache():
+    fetches = Counter()
+
+    def listings(request: httpx.Request) -> httpx.Response:
+        fetches[request.url.path] += 1
+        if request.url.path == f"/v1/listings/{LISTING['id']}":
+            return httpx.Response(200, json=LISTING)
+        return httpx.Response(404, json={"detail": "Listing not found"})
+
+    messaging = load_service("messaging-service", {**service_env("messaging"), "LISTING_EVENTS_SECRET": EVENTS_SECRET})
+    messaging.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging.http_clients.clients.use("listings", stub_client("http://listings-service", listings))
+    app = messaging.main.app
+    listing_path = f"/v1/listings/{LISTING['id']}"
+    buyers = iter(range(100, 200))
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://messaging") as client:
+            async def start_conversation():
+                # A new buyer each time, so the create path always needs the listing
+                response = await client.post(
+                    "/v1/conversations/", json={"listing_id": LISTING["id"]},
+                    headers=bearer(next(buyers))
+                )
+                assert response.status_code == 200, response.text
+                assert response.json()["listing_title"] == LISTING["title"]
+
+            async def listing_event(event_type: str, secret: str = EVENTS_SECRET):
+                return await client.post(
+                    "/internal/listing-events", json={"type": event_type, "listing_id": LISTING["id"]},
+                    headers={"X-Listing-Events-Secret": secret}
+                )
+
+            await start_conversation()
+            await start_conversation()
+            await start_conversation()
+            assert fetches[listing_path] == 1, f"cache hits still called listings-service: {fetches}"
+            stats = messaging.external_clients.ListingsClient.cache_stats()
+            assert stats["hits"] == 2 and stats["misses"] == 1, stats
+
+            # A forged event is refused and leaves the entry alone
+            assert (await listing_event("listing.updated", "wrong")).status_code == 403
+            await start_conversation()
+            assert fetches[listing_path] == 1, fetches
+
+            for event_type in ("listing.updated", "listing.deleted"):
+                before = fetches[listing_path]
+                assert (await listing_event(event_type)).status_code == 204
+                await start_conversation()
+                assert fetches[listing_path] == before + 1, f"{event_type} did not evict the cached listing"
+                await start_conversation()
+                assert fetches[listing_path] == before + 1, f"the listing was not cached again after {event_type}"
+
+            # Events for listings that were never cached are harmless
+            response = await client.post(
+                "/internal/listing-events", json={"type": "listing.deleted", "listing_id": 999},
+                headers={"X-Listing-Events-Secret": EVENTS_SECRET}
+            )
+            assert response.status_code == 204
+
+    await messaging.database.engine.dispose()
+
+async def check_ids_lookup():
+    listings = load_service("listings-service", {**service_env("listings"), "RESPONSE_CACHE_BACKEND": "off"})
+    models = listings.models
+    max_ids = listings.config.settings.listings_max_page_size
+    app = listings.main.app
+
+    def seed(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"listing {i}",
+            "description": "in good condition",
+            "price": 10.0 * i,
+            "category": models.ListingCategory.OTHER,
+            # Batch lookups are by id only, so sold listings come back too
+            "status": models.ListingStatus.SOLD if i == 2 else models.ListingStatus.AVAILABLE,
+            "seller_email": "seller@ncsu.edu",
+            "seller_id": 1,
+            "images": [],
+        } for i in range(1, 7)])
+
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            async def lookup(ids: str) -> httpx.Response:
+                return await client.get("/v1/listings/", params={"ids": ids})
+
+            response = await lookup("3,1,2")
+            assert response.status_code == 200, response.text
+            assert [listing["id"] for listing in response.json()] == [3, 1, 2]
+            assert response.json()[0]["title"] == "listing 3"
+
+            # Unknown ids are left out and repeats come back once, in the order asked for
+            response = await lookup("999,4,4,1000,1")
+            assert response.status_code == 200, response.text
+            assert [listing["id"] for listing in response.json()] == [4, 1]
+            assert (await lookup("999")).json() == []
+
+            # Other filters don't apply to a batch lookup
+            response = await client.get("/v1/listings/", params={"ids": "2,5", "category": "textbooks"})
+            assert [listing["id"] for listing in response.json()] == [2, 5]
+
+            assert (await lookup(",".join(str(i) for i in range(1, max_ids + 1)))).status_code == 200
+            for ids in (",".join(str(i) for i in range(1, max_ids + 2)), "1,two", "1;2"):
+                response = await lookup(ids)
+                assert response.status_code == 400, f"ids={ids!r}: {response.status_code} {response.text}"
+            # The limit counts distinct ids
+            assert (await lookup(",".join(["1"] * (max_ids + 1)))).status_code == 200
+
+    await listings.database.engine.dispose()
+
+def test_cached_listing_lookups_and_eviction():
+    asyncio.run(check_listing_cache())
+
+def test_ids_lookup():
+    asyncio.run(check_ids_lookup())
+
+def main():
+    failed = False
+    for check in (test_cached_listing_lookups_and_eviction, test_ids_lookup):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Instrumentation checks: GET /metrics, route-template labels, N+1 detection and failed upstream calls.
+
+Runs listings-service and messaging-service in-process with METRICS_ENABLED=true
+against fresh SQLite databases; upstreams are stand-ins on an httpx.MockTransport.
+
+    python3 test_metrics.py
+    python3 -m pytest test_metrics.py
+"""
+import asyncio
+import os
+import re
+import sys
+import httpx
+from fastapi import Depends
+from sqlalchemy import select
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import bearer, service_env, stub_client
+from service_loader import load_service
+
+N_PLUS_ONE_THRESHOLD = 5
+SAMPLE = re.compile(r"^([a-z_]+)(\{.*\})? (\S+)$")
+
+def env(service: str) -> dict:
+    return {
+        **service_env(service),
+        "RESPONSE_CACHE_BACKEND": "off",
+        "METRICS_ENABLED": "true",
+        "N_PLUS_ONE_THRESHOLD": str(N_PLUS_ONE_THRESHOLD),
+    }
+
+def parse_metrics(text: str) -> dict:
+    """{(name, labels): value} from the Prometheus text format; labels as the raw {...} string"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"malformed sample line: {line!r}"
+        name, labels, value = match.groups()
+        samples[(name, labels or "")] = float(value)
+    return samples
+
+async def scrape(client) -> dict:
+    response = await client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    return parse_metrics(response.text)
+
+async def check_listings_metrics():
+    listings = load_service("listings-service", env("listings"))
+    app = listings.main.app
+    models = listings.models
+
+    # A deliberate N+1: one SELECT per id, the shape db_n_plus_one_total exists to catch
+    @app.get("/debug/one-by-one/{count}")
+    async def one_by_one(count: int, db=Depends(listings.database.get_db)):
+        for listing_id in range(1, count + 1):
+            await db.execute(select(models.Listing).filter(models.Listing.id == listing_id))
+        return {"queries": count}
+
+    def seed(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"listing {i}",
+            "price": 10.0,
+            "category": models.ListingCategory.OTHER,
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": "seller@ncsu.edu",
+            "seller_id": 1,
+            "images": [],
+        } for i in range(1, 6)])
+
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            # Twenty different ids, five of which exist, plus paths that match no route
+            for listing_id in range(1, 21):
+                await client.get(f"/v1/listings/{listing_id}")
+            for path in ("/no/such/path", "/v1/listings/1/nope", "/wp-login.php"):
+                assert (await client.get(path)).status_code == 404
+            assert (await client.get("/v1/listings/")).status_code == 200
+
+            samples = await scrape(client)
+            durations = {
+                labels: value for (name, labels), value in samples.items()
+                if name == "http_request_duration_seconds_count"
+            }
+            assert durations[
+                '{method="GET",route="/v1/listings/{listing_id}",status="200"}'
+            ] == 5, durations
+            assert durations[
+                '{method="GET",route="/v1/listings/{listing_id}",status="404"}'
+            ] == 15, durations
+            assert durations['{method="GET",route="unmatched",status="404"}'] == 3, durations
+            assert durations['{method="GET",route="/v1/listings/",status="200"}'] == 1, durations
+            # Labels come from route templates, so twenty ids and three junk paths add no series of their own
+            routes = {re.search(r'route="([^"]*)"', labels).group(1) for (_, labels) in samples if 'route="' in labels}
+            assert routes <= {"/v1/listings/{listing_id}", "/v1/listings/", "unmatched"}, routes
+            assert samples[
+                ("db_queries_per_request_count", '{method="GET",route="/v1/listings/{listing_id}"}')
+            ] == 20
+            assert samples[("db_queries_total", '{route="/v1/listings/{listing_id}"}')] >= 20
+
+            # N+1 detection fires at N_PLUS_ONE_THRESHOLD repeats, not one below it
+            n_plus_one = ("db_n_plus_one_total", '{method="GET",route="/debug/one-by-one/{count}"}')
+            assert (await client.get(f"/debug/one-by-one/{N_PLUS_ONE_THRESHOLD - 1}")).status_code == 200
+            assert n_plus_one not in await scrape(client)
+            assert (await client.get(f"/debug/one-by-one/{N_PLUS_ONE_THRESHOLD}")).status_code == 200
+            assert (await scrape(client))[n_plus_one] == 1
+            assert (await client.get(f"/debug/one-by-one/{N_PLUS_ONE_THRESHOLD * 3}")).status_code == 200
+            assert (await scrape(client))[n_plus_one] == 2
+
+    await listings.database.engine.dispose()
+
+async def check_failed_upstream_calls():
+    messaging = load_service("messaging-service", env("messaging"))
+    errors = iter([httpx.ConnectError("connection refused"), httpx.ReadTimeout("timed out")])
+
+    def unreachable(request: httpx.Request) -> httpx.Response:
+        raise next(errors)
+
+    messaging.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging.http_clients.clients.use(
+        "listings", httpx.AsyncClient(transport=httpx.MockTransport(unreachable), base_url="http://listings-service")
+    )
+
+    app = messaging.main.app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://messaging") as client:
+            for listing_id in (1, 2):
+                response = await client.post(
+                    "/v1/conversations/", json={"listing_id": listing_id},
+                    headers=bearer(2)
+                )
+                assert response.status_code == 503, response.text
+
+            samples = await scrape(client)
+            failed = ("http_client_request_duration_seconds_count", '{upstream="listings",method="GET",status="error"}')
+            assert samples.get(failed) == 2, {key: value for key, value in samples.items() if "client" in key[0]}
+            assert samples[("http_client_request_duration_seconds_count", '{upstream="auth",method="GET",status="200"}')] >= 1
+            assert samples[(
+                "http_request_duration_seconds_count", '{method="POST",route="/v1/conversations/",status="503"}'
+            )] == 2
+
+    await messaging.database.engine.dispose()
+
+def test_metrics_use_route_templates_and_detect_n_plus_one():
+    asyncio.run(check_listings_metrics())
+
+def test_failed_upstream_calls_are_counted():
+    asyncio.run(check_failed_upstream_calls())
+
+def main():
+    failed = False
+    for check in (test_metrics_use_route_templates_and_detect_n_plus_one, test_failed_upstream_calls_are_counted):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
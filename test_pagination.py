@@ -0,0 +1,126 @@
+"""Keyset pagination checks for GET /v1/listings/ on a large seeded SQLite database.
+
+Thousands of listings share a handful of created_at values, so every page
+boundary falls inside a tie. Walking next_cursor to the end must return each
+matching listing exactly once, in the same order as the unpaginated response.
+
+    python3 test_pagination.py
+    python3 -m pytest test_pagination.py
+"""
+import asyncio
+import base64
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import service_env
+from service_loader import load_service
+
+LISTINGS = 3000
+# Listings created in the same second; pages of 37 never line up with these groups
+SAME_SECOND = 250
+PAGE_SIZE = 37
+WORDS = ["calculus", "textbook", "desk", "lamp", "laptop", "charger", "bike", "hoodie"]
+
+QUERIES = [
+    {},
+    {"category": "textbooks"},
+    {"min_price": 100, "max_price": 600},
+    {"status": "sold"},
+    {"search": "calculus"},
+    {"search": "calc cond"},
+    {"search": "calculus", "sort": "relevance"},
+    {"search": "calc cond", "sort": "relevance"},
+    {"search": "desk", "category": "furniture", "max_price": 900},
+]
+
+def seed(listings):
+    models = listings.models
+    categories = list(models.ListingCategory)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def run(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"{WORDS[i % len(WORDS)]} {WORDS[i * 7 % len(WORDS)]} {i}",
+            "description": f"{WORDS[i * 3 % len(WORDS)]} in good condition",
+            "price": round(1 + i * 7 % 997, 2),
+            "category": categories[i % len(categories)],
+            "status": models.ListingStatus.SOLD if i % 10 == 0 else models.ListingStatus.AVAILABLE,
+            "seller_email": f"seller{i % 40}@ncsu.edu",
+            "seller_id": i % 40,
+            "images": [],
+            "created_at": base + timedelta(seconds=i // SAME_SECOND),
+        } for i in range(LISTINGS)])
+    return run
+
+async def walk(client, params):
+    ids, cursor = [], None
+    while True:
+        page_params = dict(params, limit=PAGE_SIZE)
+        if cursor:
+            page_params["cursor"] = cursor
+        response = await client.get("/v1/listings/", params=page_params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+        assert len(page["items"]) == PAGE_SIZE, f"short page with a next_cursor for {params}"
+
+async def check_pagination():
+    listings = load_service("listings-service", {**service_env("listings"), "RESPONSE_CACHE_BACKEND": "off"})
+    app = listings.main.app
+
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed(listings))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            for params in QUERIES:
+                response = await client.get("/v1/listings/", params=params)
+                assert response.status_code == 200, response.text
+                expected = [item["id"] for item in response.json()]
+                assert len(expected) > PAGE_SIZE, f"{params} matches too few listings to paginate"
+
+                paged = await walk(client, params)
+                duplicates = len(paged) - len(set(paged))
+                assert not duplicates, f"{duplicates} listings repeated across pages for {params}"
+                missing = set(expected) - set(paged)
+                assert not missing, f"{len(missing)} listings never returned for {params}"
+                assert paged == expected, f"paged order differs from the unpaginated order for {params}"
+
+            first = (await client.get("/v1/listings/", params={"limit": PAGE_SIZE})).json()["next_cursor"]
+            # Cut short, the position no longer parses as JSON
+            tampered = first[:-4]
+            for cursor in (
+                "garbage!",
+                "not-base64-at-all",
+                tampered,
+                base64.urlsafe_b64encode(b"{}").decode(),
+                base64.urlsafe_b64encode(b"null").decode(),
+                base64.urlsafe_b64encode(b'["yesterday", 5]').decode(),
+                base64.urlsafe_b64encode(b'["2024-01-01T00:00:00+00:00", "x"]').decode(),
+                base64.urlsafe_b64encode(b'["2024-01-01T00:00:00+00:00", 5, "high"]').decode(),
+                base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+            ):
+                response = await client.get("/v1/listings/", params={"limit": PAGE_SIZE, "cursor": cursor})
+                assert response.status_code == 400, f"cursor {cursor!r}: {response.status_code} {response.text}"
+
+    await listings.database.engine.dispose()
+
+def test_cursor_pagination_matches_unpaginated_order():
+    asyncio.run(check_pagination())
+
+def main():
+    try:
+        test_cursor_pagination_matches_unpaginated_order()
+        print("test_cursor_pagination_matches_unpaginated_order: OK")
+    except AssertionError as e:
+        print(f"test_cursor_pagination_matches_unpaginated_order: FAILED\n{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Profiler checks for POST /debug/profile: token, limits, one profile at a time, and the collapsed output.
+
+Runs listings-service in-process with PROFILER_TOKEN set against a small
+seeded SQLite database, and keeps it busy with listing reads while sampling.
+
+    python3 test_profiler.py
+    python3 -m pytest test_profiler.py
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import service_env
+from service_loader import load_service
+
+PROFILER_TOKEN = "profiler-check"
+MAX_SECONDS = 2
+MAX_REQUESTS = 20
+FOLDED_LINE = re.compile(r"^\S.* (\d+)$")
+
+async def keep_busy(client, stop: asyncio.Event):
+    while not stop.is_set():
+        assert (await client.get("/v1/listings/")).status_code == 200
+
+async def profile_while_busy(client, params: dict) -> httpx.Response:
+    stop = asyncio.Event()
+    busy = asyncio.create_task(keep_busy(client, stop))
+    try:
+        return await client.post("/debug/profile", params=params, headers={"X-Profiler-Token": PROFILER_TOKEN})
+    finally:
+        stop.set()
+        await busy
+
+async def check_profiler():
+    listings = load_service("listings-service", {
+        **service_env("listings"),
+        "RESPONSE_CACHE_BACKEND": "off",
+        "PROFILER_TOKEN": PROFILER_TOKEN,
+        "PROFILER_MAX_SECONDS": str(MAX_SECONDS),
+        "PROFILER_MAX_REQUESTS": str(MAX_REQUESTS),
+    })
+    models = listings.models
+    app = listings.main.app
+
+    def seed(connection):
+        connection.execute(models.Listing.__table__.insert(), [{
+            "title": f"listing {i}",
+            "price": 10.0 + i,
+            "category": models.ListingCategory.OTHER,
+            "status": models.ListingStatus.AVAILABLE,
+            "seller_email": "seller@ncsu.edu",
+            "seller_id": 1,
+            "images": [],
+        } for i in range(200)])
+
+    async with app.router.lifespan_context(app):
+        await listings.database.run_in_transaction(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings", timeout=30) as client:
+            async def profile(params: dict, token=PROFILER_TOKEN) -> httpx.Response:
+                headers = {"X-Profiler-Token": token} if token is not None else {}
+                return await client.post("/debug/profile", params=params, headers=headers)
+
+            for token in (None, "", "wrong", PROFILER_TOKEN + "x"):
+                response = await profile({"seconds": 0.1}, token)
+                assert response.status_code == 403, f"token {token!r}: {response.status_code}"
+
+            for params in (
+                {},
+                {"seconds": MAX_SECONDS + 1},
+                {"requests": MAX_REQUESTS + 1},
+                {"requests": 1, "seconds": MAX_SECONDS + 1},
+            ):
+                response = await profile(params)
+                assert response.status_code == 400, f"{params}: {response.status_code} {response.text}"
+            assert listings.profiling._active is None
+
+            # A second profile while one runs
+            first = asyncio.create_task(profile({"seconds": 0.5}))
+            while listings.profiling._active is None:
+                await asyncio.sleep(0.01)
+            response = await profile({"seconds": 0.1})
+            assert response.status_code == 409, response.text
+            assert (await first).status_code == 200
+            assert listings.profiling._active is None
+            # ...and once it has finished, the next one may start
+            assert (await profile({"seconds": 0.1})).status_code == 200
+
+            response = await profile_while_busy(client, {"seconds": 0.5, "interval_ms": 5})
+            assert response.status_code == 200, response.text
+            assert response.headers["content-type"].startswith("text/plain")
+            samples = int(response.headers["X-Profile-Samples"])
+            assert samples > 0
+            assert float(response.headers["X-Profile-Seconds"]) >= 0.5
+            assert "X-Profile-Requests" not in response.headers
+            lines = response.text.strip().splitlines()
+            assert lines, "empty profile"
+            counts = []
+            for line in lines:
+                match = FOLDED_LINE.match(line)
+                assert match, f"not a folded stack line: {line!r}"
+                counts.append(int(match.group(1)))
+            assert sum(counts) == samples
+            assert any("get_listings" in line for line in lines), "the busy endpoint never showed up"
+
+            # Request mode stops after the next N matching requests
+            response = await profile_while_busy(client, {"requests": 3, "route": "/v1/listings/", "method": "get"})
+            assert response.status_code == 200, response.text
+            assert response.headers["X-Profile-Requests"] == "3"
+
+            response = await profile_while_busy(client, {"seconds": 0.2, "format": "speedscope"})
+            assert response.status_code == 200, response.text
+            document = json.loads(response.content)
+            profile_data = document["profiles"][0]
+            assert profile_data["type"] == "sampled" and len(profile_data["samples"]) == len(profile_data["weights"])
+            assert all(index < len(document["shared"]["frames"]) for sample in profile_data["samples"] for index in sample)
+
+    await listings.database.engine.dispose()
+
+def test_profiler():
+    asyncio.run(check_profiler())
+
+def main():
+    try:
+        test_profiler()
+        print("test_profiler: OK")
+    except AssertionError as e:
+        print(f"test_profiler: FAILED\n{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Query-plan regression checks: the hot listing and messaging queries must use indexes.
+
+Each service's real query code runs against a freshly migrated SQLite database;
+the SELECTs it emits are captured and checked with EXPLAIN QUERY PLAN.
+
+    python3 test_query_plans.py
+    python3 -m pytest test_query_plans.py
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_loader import load_service
+
+FULL_SCAN = re.compile(r"^SCAN (listings|conversations|messages)$")
+
+class QueryCapture:
+    def __init__(self, engine, db_path):
+        self.db_path = db_path
+        self.statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self._capture)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def plans(self):
+        captured, self.statements = self.statements, []
+        with sqlite3.connect(self.db_path) as conn:
+            return [
+                (statement, [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)])
+                for statement, parameters in captured
+            ]
+
+def assert_indexed(plans, expected_index=None, ordered=False):
+    assert plans, "no queries captured"
+    for statement, plan in plans:
+        scans = [step for step in plan if FULL_SCAN.match(step)]
+        assert not scans, f"full table scan {scans} in:\n{statement}\nplan: {plan}"
+        if ordered:
+            assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan), \
+                f"ORDER BY not served by an index in:\n{statement}\nplan: {plan}"
+    if expected_index:
+        steps = [step for _, plan in plans for step in plan]
+        assert any(expected_index in step for step in steps), f"{expected_index} not used: {steps}"
+
+def migrated_service(service, db_name):
+    db_path = os.path.join(tempfile.mkdtemp(), db_name)
+    env = {"DATABASE_URL": f"sqlite:///{db_path}", "JWT_SECRET": "plan-check", "JWT_ALGORITHM": "HS256"}
+    return load_service(service, env), db_path
+
+async def check_listing_plans():
+    listings, db_path = migrated_service("listings-service", "listings.db")
+    schemas, models = listings.schemas, listings.models
+
+    async with listings.main.app.router.lifespan_context(listings.main.app):
+        capture = QueryCapture(listings.database.engine, db_path)
+        async with listings.database.SessionLocal() as db:
+            service = listings.service.ListingService(db)
+
+            await service.get_listings_page(schemas.ListingFilters(), 20)
+            assert_indexed(capture.plans(), "ix_listings_status_created_at", ordered=True)
+
+            await service.get_listings_page(schemas.ListingFilters(category=models.ListingCategory.TEXTBOOKS), 20)
+            assert_indexed(capture.plans(), "ix_listings_category_status_created_at", ordered=True)
+
+            await service.get_listings(schemas.ListingFilters(min_price=10, max_price=50))
+            assert_indexed(capture.plans())
+
+            await service.get_listing_by_id(1)
+            assert_indexed(capture.plans())
+
+    await listings.database.engine.dispose()
+
+async def check_messaging_plans():
+    messaging, db_path = migrated_service("messaging-service", "messaging.db")
+    schemas = messaging.schemas
+    buyer = {"user_id": 2, "email": "buyer@ncsu.edu"}
+    seller = {"user_id": 1, "email": "seller@ncsu.edu"}
+    listing = {"seller_id": 1, "seller_email": "seller@ncsu.edu", "title": "Calculus Textbook"}
+
+    async with messaging.main.app.router.lifespan_context(messaging.main.app):
+        capture = QueryCapture(messaging.database.engine, db_path)
+        async with messaging.database.SessionLocal() as db:
+            service = messaging.service.MessagingService(db)
+
+            conversation = await service.create_conversation(schemas.ConversationCreate(listing_id=1), buyer, listing)
+            await service.create_message(conversation.id, schemas.MessageCreate(content="Still available?"), buyer)
+            capture.plans()
+
+            await service.get_conversation_for_listing(1, buyer["user_id"])
+            assert_indexed(capture.plans(), "uq_conversations_listing_id_buyer_id")
+
+            await service.get_user_conversations(seller["user_id"])
+            assert_indexed(capture.plans(), "ix_conversations_seller_id_updated_at")
+
+            await service.get_conversation_messages(conversation.id, seller["user_id"])
+            assert_indexed(capture.plans(), "ix_messages_conversation_id_created_at")
+
+            await service.get_conversation_messages(conversation.id, seller["user_id"], before_id=100, limit=20)
+            assert_indexed(capture.plans(), "ix_messages_conversation_id_id", ordered=True)
+
+            await service.get_conversation_messages(conversation.id, seller["user_id"], since_id=1, limit=20)
+            assert_indexed(capture.plans(), "ix_messages_conversation_id_id", ordered=True)
+
+    await messaging.database.engine.dispose()
+
+def test_listing_queries_use_indexes():
+    asyncio.run(check_listing_plans())
+
+def test_messaging_queries_use_indexes():
+    asyncio.run(check_messaging_plans())
+
+def main():
+    print("Checking query plans...")
+    failed = False
+    for check in (test_listing_queries_use_indexes, test_messaging_queries_use_indexes):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
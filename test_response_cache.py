@@ -0,0 +1,147 @@
+"""Response cache checks for listings-service's public reads, on both cache backends.
+
+Each backend goes through the same flow: a read and a conditional read that
+gets 304, a create/update/delete that must drop exactly the lists and the
+changed listing, then a fresh 200 with a new ETag. Auth is a stand-in on an
+httpx.MockTransport; tokens are signed with the shared JWT secret.
+
+    python3 test_response_cache.py
+    python3 -m pytest test_response_cache.py
+"""
+import asyncio
+import os
+import sys
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import bearer, service_env, stub_client
+from service_loader import load_service
+
+MAX_AGE = 15
+
+async def check_backend(make_backend):
+    listings = load_service("listings-service", {
+        **service_env("listings"),
+        "RESPONSE_CACHE_BACKEND": "memory",
+        "RESPONSE_CACHE_MAX_AGE": str(MAX_AGE),
+    })
+    listings.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    cache = listings.response_cache.response_cache
+    cache.backend = backend = make_backend(listings.response_cache)
+    # Record which scopes each write drops
+    bumped = []
+    bump = backend.bump
+
+    async def recording_bump(scope):
+        bumped.append(scope)
+        await bump(scope)
+    backend.bump = recording_bump
+
+    app = listings.main.app
+    seller = bearer(1, "seller@ncsu.edu")
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            async def create(title: str) -> int:
+                response = await client.post("/v1/listings/", json={
+                    "title": title, "price": 25.0, "category": "furniture"
+                }, headers=seller)
+                assert response.status_code == 200, response.text
+                return response.json()["id"]
+
+            async def get(path: str, etag=None) -> httpx.Response:
+                return await client.get(path, headers={"If-None-Match": etag} if etag else {})
+
+            async def assert_cached(path: str, etag: str):
+                """A conditional read answered from the cache without rendering"""
+                misses = cache.misses
+                response = await get(path, etag)
+                assert response.status_code == 304, f"{path}: {response.status_code}"
+                assert cache.misses == misses, f"{path} was rendered again"
+
+            async def assert_changed(path: str, etag: str) -> str:
+                response = await get(path, etag)
+                assert response.status_code == 200, f"{path}: {response.status_code}"
+                assert response.headers["ETag"] != etag, f"{path} kept its ETag"
+                return response.headers["ETag"]
+
+            desk, lamp = await create("Standing desk"), await create("Desk lamp")
+            desk_path, lamp_path, lists_path = f"/v1/listings/{desk}", f"/v1/listings/{lamp}", "/v1/listings/"
+            assert bumped == [f"listing:{desk}", "lists", f"listing:{lamp}", "lists"], bumped
+
+            # Request, then conditional request
+            etags = {}
+            for path in (desk_path, lamp_path, lists_path):
+                response = await get(path)
+                assert response.status_code == 200, response.text
+                etag = etags[path] = response.headers["ETag"]
+                assert etag.startswith('"') and etag.endswith('"'), f"{path}: not a strong ETag {etag}"
+                assert response.headers["Cache-Control"] == f"public, max-age={MAX_AGE}"
+
+                hits = cache.hits
+                response = await get(path, etag)
+                assert response.status_code == 304, f"{path}: {response.status_code}"
+                assert response.content == b""
+                assert response.headers["ETag"] == etag
+                assert response.headers["Cache-Control"] == f"public, max-age={MAX_AGE}"
+                assert cache.hits == hits + 1
+            assert (await get(desk_path, f"W/{etags[desk_path]}")).status_code == 304
+            assert (await get(desk_path, f'"stale", {etags[desk_path]}')).status_code == 304
+            assert (await get(desk_path, '"stale"')).status_code == 200
+
+            # Update: the desk and every list are dropped, the lamp stays cached
+            bumped.clear()
+            response = await client.patch(desk_path, json={"title": "Sit-stand desk"}, headers=seller)
+            assert response.status_code == 200, response.text
+            assert bumped == [f"listing:{desk}", "lists"], bumped
+            await assert_cached(lamp_path, etags[lamp_path])
+            etags[desk_path] = await assert_changed(desk_path, etags[desk_path])
+            assert (await get(desk_path)).json()["title"] == "Sit-stand desk"
+            etags[lists_path] = await assert_changed(lists_path, etags[lists_path])
+
+            # A fresh 200 is cached again under its new ETag
+            await assert_cached(desk_path, etags[desk_path])
+            await assert_cached(lists_path, etags[lists_path])
+
+            # Create: only the new listing and the lists
+            bumped.clear()
+            chair = await create("Office chair")
+            assert bumped == [f"listing:{chair}", "lists"], bumped
+            await assert_cached(desk_path, etags[desk_path])
+            await assert_cached(lamp_path, etags[lamp_path])
+            etags[lists_path] = await assert_changed(lists_path, etags[lists_path])
+            assert chair in [listing["id"] for listing in (await get(lists_path)).json()]
+
+            # Delete: the lamp and the lists, nothing else
+            bumped.clear()
+            response = await client.delete(lamp_path, headers=seller)
+            assert response.status_code == 200, response.text
+            assert bumped == [f"listing:{lamp}", "lists"], bumped
+            await assert_cached(desk_path, etags[desk_path])
+            assert (await get(lamp_path, etags[lamp_path])).status_code == 404
+            etags[lists_path] = await assert_changed(lists_path, etags[lists_path])
+            assert lamp not in [listing["id"] for listing in (await get(lists_path)).json()]
+
+    await listings.database.engine.dispose()
+
+def test_memory_backend():
+    asyncio.run(check_backend(lambda module: module.MemoryBackend(maxsize=100, ttl=60)))
+
+def test_external_backend():
+    asyncio.run(check_backend(lambda module: module.ExternalBackend(module.FakeExternalStore())))
+
+def main():
+    failed = False
+    for check in (test_memory_backend, test_external_backend):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
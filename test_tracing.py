@@ -0,0 +1,214 @@
+"""Tracing checks: traceparent parsing, the in-memory exporter, and one trace across messaging and listings.
+
+Messaging calls a real listings-service app over httpx.ASGITransport, so the
+traceparent header crosses an actual hop; auth is a stand-in on an
+httpx.MockTransport. Both services export to TRACING_EXPORTER=memory.
+
+    python3 test_tracing.py
+    python3 -m pytest test_tracing.py
+"""
+import asyncio
+import os
+import sys
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import bearer, service_env, stub_client
+from service_loader import load_service
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+CALLER = {"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01"}
+
+def env(service: str) -> dict:
+    return {**service_env(service), "TRACING_EXPORTER": "memory", "TRACING_SAMPLE_RATE": "1.0"}
+
+def exported(service) -> list:
+    return list(service.tracing.tracer.exporter.spans)
+
+def only(spans: list, name: str) -> dict:
+    matches = [span for span in spans if span["name"] == name]
+    assert len(matches) == 1, f"expected one {name} span, got {[span['name'] for span in spans]}"
+    return matches[0]
+
+def test_parse_traceparent():
+    tracing = load_service("listings-service", env("listings"), modules=("tracing",)).tracing
+    parse = tracing.parse_traceparent
+
+    assert parse(f"00-{TRACE_ID}-{SPAN_ID}-01") == (TRACE_ID, SPAN_ID, True)
+    assert parse(f"00-{TRACE_ID}-{SPAN_ID}-00") == (TRACE_ID, SPAN_ID, False)
+    # Only the lowest flag bit means sampled; ids are case-insensitive
+    assert parse(f"00-{TRACE_ID}-{SPAN_ID}-03") == (TRACE_ID, SPAN_ID, True)
+    assert parse(f" 00-{TRACE_ID.upper()}-{SPAN_ID.upper()}-01 ") == (TRACE_ID, SPAN_ID, True)
+    # Later versions may append fields
+    assert parse(f"01-{TRACE_ID}-{SPAN_ID}-01-extra") == (TRACE_ID, SPAN_ID, True)
+
+    for header in (
+        None,
+        "",
+        "garbage",
+        f"00-{TRACE_ID}-{SPAN_ID}",
+        f"00-{TRACE_ID}-{SPAN_ID}-01-extra",
+        f"ff-{TRACE_ID}-{SPAN_ID}-01",
+        f"0-{TRACE_ID}-{SPAN_ID}-01",
+        f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+        f"00-{TRACE_ID}-{SPAN_ID}0-01",
+        f"00-{TRACE_ID}-{SPAN_ID}-1",
+        f"00-{'z' * 32}-{SPAN_ID}-01",
+        f"00-{TRACE_ID}-{SPAN_ID}-zz",
+        f"00-{'0' * 32}-{SPAN_ID}-01",
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+    ):
+        assert parse(header) is None, f"{header!r} was accepted"
+
+def test_in_memory_exporter():
+    tracing = load_service("listings-service", env("listings"), modules=("tracing",)).tracing
+    exporter = tracing.InMemoryExporter(maxlen=3)
+    tracer = tracing.Tracer(exporter, 1.0)
+
+    with tracer.span("outer") as outer:
+        with tracer.span("inner") as inner:
+            pass
+    # Children finish, and are exported, before their parents
+    assert [span["name"] for span in exporter.spans] == ["inner", "outer"]
+    inner_dict, outer_dict = exporter.spans
+    assert inner_dict["trace_id"] == outer_dict["trace_id"] == outer.trace_id
+    assert inner_dict["parent_id"] == outer.span_id and outer_dict["parent_id"] is None
+    assert inner_dict["span_id"] == inner.span_id
+    assert outer_dict["duration_ms"] >= inner_dict["duration_ms"] >= 0
+    assert outer_dict["service"] == "listings-service"
+
+    try:
+        with tracer.span("failing"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert exporter.spans[-1]["name"] == "failing" and exporter.spans[-1]["error"] == "ValueError"
+
+    # The buffer keeps only the latest maxlen spans
+    for index in range(5):
+        with tracer.span(f"span {index}"):
+            pass
+    assert [span["name"] for span in exporter.spans] == ["span 2", "span 3", "span 4"]
+    exporter.clear()
+    assert len(exporter.spans) == 0
+
+    # Unsampled spans are never exported, whether the caller or the sample rate decided it
+    span = tracer.start_span("unsampled caller", "server", f"00-{TRACE_ID}-{SPAN_ID}-00")
+    assert (span.trace_id, span.parent_id, span.sampled) == (TRACE_ID, SPAN_ID, False)
+    tracer.end_span(span)
+    with tracing.Tracer(exporter, 0.0).span("never sampled"):
+        pass
+    assert len(exporter.spans) == 0
+
+async def check_trace_crosses_services():
+    listings = load_service("listings-service", env("listings"))
+    listings.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging = load_service("messaging-service", env("messaging"))
+    messaging.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging.http_clients.clients.use("listings", httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=listings.main.app), base_url="http://listings-service"
+    ))
+
+    async with listings.main.app.router.lifespan_context(listings.main.app), \
+            messaging.main.app.router.lifespan_context(messaging.main.app):
+        transport = httpx.ASGITransport(app=listings.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://listings") as client:
+            response = await client.post("/v1/listings/", json={
+                "title": "Standing desk", "price": 120.0, "category": "furniture"
+            }, headers=bearer(1, "seller@ncsu.edu"))
+            assert response.status_code == 200, response.text
+            listing_id = response.json()["id"]
+
+        listings.tracing.tracer.exporter.clear()
+        messaging.tracing.tracer.exporter.clear()
+        transport = httpx.ASGITransport(app=messaging.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://messaging") as client:
+            response = await client.post(
+                "/v1/conversations/", json={"listing_id": listing_id},
+                headers={**bearer(2, "buyer@ncsu.edu"), **CALLER}
+            )
+            assert response.status_code == 200, response.text
+
+    messaging_spans = [span for span in exported(messaging) if span["trace_id"] == TRACE_ID]
+    listings_spans = exported(listings)
+    assert listings_spans and all(span["trace_id"] == TRACE_ID for span in listings_spans), listings_spans
+
+    # messaging: server <- handler <- client call to listings, under the caller's span
+    server = only(messaging_spans, "POST /v1/conversations/")
+    assert server["parent_id"] == SPAN_ID and server["kind"] == "server"
+    assert server["service"] == "messaging-service"
+    handler = only(messaging_spans, "handler create_conversation")
+    assert handler["parent_id"] == server["span_id"]
+    upstream = only(messaging_spans, "GET listings")
+    assert upstream["kind"] == "client" and upstream["parent_id"] == handler["span_id"]
+    assert upstream["attributes"]["http.status_code"] == 200 and upstream["error"] is None
+    assert upstream["attributes"]["http.url"] == f"http://listings-service/v1/listings/{listing_id}"
+
+    # listings: its server span continues from messaging's client span, across the hop
+    remote = only(listings_spans, "GET /v1/listings/{listing_id}")
+    assert remote["parent_id"] == upstream["span_id"] and remote["kind"] == "server"
+    assert remote["service"] == "listings-service"
+    assert remote["attributes"]["http.route"] == "/v1/listings/{listing_id}"
+    remote_handler = only(listings_spans, "handler get_listing")
+    assert remote_handler["parent_id"] == remote["span_id"]
+    queries = [span for span in listings_spans if span["name"] == "db.query"]
+    assert queries and all(span["parent_id"] == remote_handler["span_id"] for span in queries), queries
+
+    await listings.database.engine.dispose()
+    await messaging.database.engine.dispose()
+
+async def check_failed_upstream_call(error: Exception):
+    messaging = load_service("messaging-service", env("messaging"))
+
+    def unreachable(request: httpx.Request) -> httpx.Response:
+        raise error
+
+    messaging.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging.http_clients.clients.use("listings", httpx.AsyncClient(
+        transport=httpx.MockTransport(unreachable), base_url="http://listings-service"
+    ))
+    app = messaging.main.app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://messaging") as client:
+            response = await client.post(
+                "/v1/conversations/", json={"listing_id": 1},
+                headers={**bearer(2, "buyer@ncsu.edu"), **CALLER}
+            )
+            assert response.status_code == 503, response.text
+
+    spans = [span for span in exported(messaging) if span["trace_id"] == TRACE_ID]
+    upstream = only(spans, "GET listings")
+    assert upstream["error"] == type(error).__name__, upstream
+    assert upstream["duration_ms"] is not None
+    assert "http.status_code" not in upstream["attributes"]
+    assert upstream["parent_id"] == only(spans, "handler create_conversation")["span_id"]
+    assert only(spans, "POST /v1/conversations/")["attributes"]["http.status_code"] == 503
+
+    await messaging.database.engine.dispose()
+
+def test_trace_crosses_services():
+    asyncio.run(check_trace_crosses_services())
+
+def test_failed_upstream_calls_end_their_span():
+    asyncio.run(check_failed_upstream_call(httpx.ConnectError("connection refused")))
+    asyncio.run(check_failed_upstream_call(httpx.ReadTimeout("timed out")))
+
+def main():
+    failed = False
+    for check in (
+        test_parse_traceparent, test_in_memory_exporter,
+        test_trace_crosses_services, test_failed_upstream_calls_end_their_span
+    ):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
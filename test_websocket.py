@@ -0,0 +1,146 @@
+"""WebSocket push checks for messaging-service's /v1/conversations/ws, on the in-memory broker.
+
+Auth and listings-service are stand-ins on an httpx.MockTransport; tokens are
+signed with the shared JWT secret and verified locally.
+
+    python3 test_websocket.py
+    python3 -m pytest test_websocket.py
+"""
+import os
+import sys
+import time
+import httpx
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from service_fixtures import bearer, service_env, stub_client, token
+from service_loader import load_service
+
+QUEUE_SIZE = 4
+PER_USER = 2
+SELLER = {"user_id": 1, "email": "seller@ncsu.edu"}
+BUYER = {"user_id": 2, "email": "buyer@ncsu.edu"}
+LISTING = {"id": 1, "seller_id": 1, "seller_email": "seller@ncsu.edu", "title": "Standing desk"}
+
+def listings(request: httpx.Request) -> httpx.Response:
+    if request.url.path == f"/v1/listings/{LISTING['id']}":
+        return httpx.Response(200, json=LISTING)
+    return httpx.Response(404, json={"detail": "Listing not found"})
+
+def messaging_service():
+    messaging = load_service("messaging-service", {
+        **service_env("messaging"),
+        "PUBSUB_BACKEND": "memory",
+        "WS_QUEUE_SIZE": str(QUEUE_SIZE),
+        "WS_MAX_CONNECTIONS_PER_USER": str(PER_USER),
+        "WS_HEARTBEAT_SECONDS": "0.2",
+    })
+    messaging.http_clients.clients.use("auth", stub_client("http://auth-service"))
+    messaging.http_clients.clients.use("listings", stub_client("http://listings-service", listings))
+    return messaging
+
+def connect(client: TestClient, user: dict):
+    return client.websocket_connect(f"/v1/conversations/ws?token={token(user['user_id'], user['email'])}")
+
+def next_event(websocket) -> dict:
+    while True:
+        event = websocket.receive_json()
+        if event["type"] != "ping":
+            return event
+
+def eventually(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def closed_with(websocket) -> int:
+    """Read until the server closes the socket and return its close code"""
+    while True:
+        message = websocket.receive()
+        if message["type"] == "websocket.close":
+            return message["code"]
+
+def test_message_is_pushed_to_recipient():
+    messaging = messaging_service()
+    with TestClient(messaging.main.app) as client:
+        buyer = bearer(BUYER["user_id"], BUYER["email"])
+        conversation = client.post("/v1/conversations/", json={"listing_id": LISTING["id"]}, headers=buyer)
+        assert conversation.status_code == 200, conversation.text
+
+        with connect(client, SELLER) as websocket:
+            # Pings keep an idle connection alive
+            assert websocket.receive_json() == {"type": "ping"}
+            response = client.post(
+                f"/v1/conversations/{conversation.json()['id']}/messages",
+                json={"content": "Is the desk still available?"}, headers=buyer
+            )
+            assert response.status_code == 200, response.text
+
+            event = next_event(websocket)
+            assert event["type"] == "message"
+            assert event["message"]["id"] == response.json()["id"]
+            assert event["message"]["content"] == "Is the desk still available?"
+            assert event["message"]["sender_id"] == BUYER["user_id"]
+
+def test_connections_per_user_are_capped():
+    messaging = messaging_service()
+    with TestClient(messaging.main.app) as client:
+        with connect(client, SELLER), connect(client, SELLER):
+            try:
+                with connect(client, SELLER):
+                    raise AssertionError("connection over WS_MAX_CONNECTIONS_PER_USER was accepted")
+            except WebSocketDisconnect as exc:
+                assert exc.code == 1013
+            # Other users are unaffected
+            with connect(client, BUYER) as websocket:
+                assert websocket.receive_json() == {"type": "ping"}
+        # Closed connections let go of their subscriptions once the server notices the disconnect
+        assert eventually(lambda: messaging.pubsub.broker.stats()["subscriptions"] == 0)
+
+def test_slow_consumer_is_disconnected():
+    messaging = messaging_service()
+    broker = messaging.pubsub.broker
+    with TestClient(messaging.main.app) as client:
+        with connect(client, SELLER) as websocket:
+            def flood():
+                # Delivered in one go on the event loop, before the connection's sender can drain any
+                for index in range(QUEUE_SIZE + 1):
+                    broker.deliver(f"user:{SELLER['user_id']}", {"type": "message", "index": index})
+
+            client.portal.call(flood)
+            assert closed_with(websocket) == 1013
+        assert eventually(lambda: broker.stats()["subscriptions"] == 0)
+        assert broker.stats()["overflows"] == 1
+
+def test_bad_token_is_refused():
+    messaging = messaging_service()
+    with TestClient(messaging.main.app) as client:
+        forged = token(SELLER["user_id"], SELLER["email"], secret="not-the-secret")
+        for url in ("/v1/conversations/ws", "/v1/conversations/ws?token=garbage", f"/v1/conversations/ws?token={forged}"):
+            try:
+                with client.websocket_connect(url):
+                    raise AssertionError(f"{url} was accepted")
+            except WebSocketDisconnect as exc:
+                assert exc.code == 1008, f"{url}: closed with {exc.code}"
+
+def main():
+    failed = False
+    for check in (
+        test_message_is_pushed_to_recipient, test_connections_per_user_are_capped,
+        test_slow_consumer_is_disconnected, test_bad_token_is_refused
+    ):
+        try:
+            check()
+            print(f"{check.__name__}: OK")
+        except AssertionError as e:
+            failed = True
+            print(f"{check.__name__}: FAILED\n{e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()